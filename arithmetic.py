@@ -0,0 +1,25 @@
+"""
+Builtins over floats: arithmetic and comparisons, all pure (see
+`sem_lang_types.Function.pure`).
+
+`math_literals` gets them as variables to put in a context, like:
+
+    (< (* 2 3) (+ 4 5))
+"""
+import operator
+
+from sem_lang_types import Float, wrap_py_fn
+
+def math_literals():
+    """
+    The float builtins by their names (to add to the variables of a context).
+    """
+    fl = Float.tag
+    fns = [
+        (operator.add, '+', fl, fl, fl),
+        (operator.sub, '-', fl, fl, fl),
+        (operator.mul, '*', fl, fl, fl),
+        (operator.lt, '<', fl, fl, fl),
+        (operator.eq, '=', fl, fl, fl),
+    ]
+    return {fn[1]: wrap_py_fn(*fn, pure=True) for fn in fns}
@@ -0,0 +1,157 @@
+"""
+Evaluates batches of independent programs (as sources) across a pool of
+processes, each program in a fresh context of its own.
+
+The context factory is sent to the workers, so it must be picklable (a
+function defined at the top level of a module, say). Contexts themselves can
+be pickled too, as long as the variables in them can.
+"""
+import os
+import pickle
+import signal
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import tokenizer as tok
+from context import Budget
+from sem_lang_types import tag_of, UNBOXED_TAGS
+
+BatchResult = namedtuple('BatchResult', ['index', 'value', 'type', 'error'])
+BatchResult.__doc__ = """
+The evaluation of the index-th program in the batch: the value of its last
+expression and the type of that (a tag), or the error it raised (as a string).
+"""
+
+def error_result(index, e):
+    return BatchResult(index, None, None, '{}: {}'.format(type(e).__name__, e))
+
+class Timeout(Exception):
+    """
+    Raised in a program that ran for longer than it was given.
+    """
+    pass
+
+def raise_timeout(signum, frame):
+    raise Timeout("The program ran out of time")
+
+def evaluate_source(source, context):
+    """
+    Evaluates every expression in the source in the context.
+
+    Returns:
+      the value of the last expression (None for no expressions).
+    """
+    rv = None
+    for node in tok.parse_program(list(tok.tokenize(source)), context):
+        rv = context.eval(context.resolve(node))
+    return rv
+
+def run_program(context_factory, index, source, timeout=None, max_steps=None, max_allocations=None):
+    """
+    Evaluates the source in a new context (see `evaluate_batch`).
+
+    Returns:
+      `BatchResult`
+    """
+    # only the main thread gets signals (so timeouts are off elsewhere)
+    alarm = timeout is not None and hasattr(signal, 'setitimer') \
+            and threading.current_thread() is threading.main_thread()
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, raise_timeout)
+    try:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        context = context_factory()
+        if max_steps is not None or max_allocations is not None:
+            context.budget = Budget(max_steps, max_allocations)
+        value = evaluate_source(source, context)
+    except Exception as e:
+        # whatever a program raises (a `Timeout`, `context.BudgetExceeded`, an error
+        # from a builtin...) is its result, and the batch goes on
+        return error_result(index, e)
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    if type(value) not in UNBOXED_TAGS:
+        try:
+            pickle.dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # the value can't be sent back, but what it was can be
+            value = repr(value)
+    return BatchResult(index, value, tag_of(value), None)
+
+def evaluate_batch(sources, context_factory, workers=None, timeout=None, max_steps=None, max_allocations=None,
+        ordered=True):
+    """
+    Evaluates the programs across a pool of processes, yielding their results
+    as they are done. Programs run in fresh contexts, so one can't affect another.
+
+    Args:
+      sources = an iterable of the sources of the programs (read as they're needed).
+      context_factory = a picklable function making a context to evaluate in.
+      workers (default: one per CPU) = the number of processes, or 0 to
+                evaluate in this process.
+      timeout (default: none) = the seconds each program may run for (enforced
+                with SIGALRM, where there is one).
+      max_steps, max_allocations (default: none) = the `context.Budget` of each program.
+      ordered (default True) = whether to yield the results in the order of the
+                sources, or as they are done.
+    Yields:
+      `BatchResult`s, with a result for every source. A program that can't be
+      run or sent back (one whose worker died, say) gets an error too, and the
+      pool is started over when a worker dies.
+    """
+    if workers == 0:
+        for index, source in enumerate(sources):
+            yield run_program(context_factory, index, source, timeout, max_steps, max_allocations)
+        return
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(workers)
+    try:
+        # enough are submitted to keep the workers busy, but not the whole batch
+        window = 4 * workers
+        pending = set()
+        indices = dict()
+        done_early = dict()
+        next_index = 0
+        sources = enumerate(sources)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) + len(done_early) < window:
+                try:
+                    index, source = next(sources)
+                except StopIteration:
+                    exhausted = True
+                    break
+                args = (run_program, context_factory, index, source, timeout, max_steps, max_allocations)
+                try:
+                    future = pool.submit(*args)
+                except BrokenProcessPool:
+                    # a worker died (taking the programs it had with it)
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(workers)
+                    future = pool.submit(*args)
+                indices[future] = index
+                pending.add(future)
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = indices.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # the pool broke or the program couldn't be pickled
+                    result = error_result(index, e)
+                if not ordered:
+                    yield result
+                    continue
+                done_early[result.index] = result
+            while next_index in done_early:
+                yield done_early.pop(next_index)
+                next_index += 1
+    finally:
+        pool.shutdown()
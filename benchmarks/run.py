@@ -0,0 +1,105 @@
+"""
+Runs the benchmarks (see `workloads`), reporting the throughput and peak memory
+of each and saving them as JSON to compare with a run from another commit:
+
+    python benchmarks/run.py --output before.json
+    ... (change things)
+    python benchmarks/run.py --output after.json --compare before.json
+
+The time of a benchmark is the best of its repeats. Its peak memory is measured
+(with tracemalloc) in a run of its own, so as not to slow the timed runs.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from workloads import WORKLOADS
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def peak_memory(run):
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def measure(name, scale=1, repeat=5):
+    """
+    Runs the benchmark.
+
+    Returns:
+      dict of the seconds of the best run, the throughput (units per second) and
+      the peak bytes allocated in a run.
+    """
+    workload = WORKLOADS[name](scale)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        workload.run()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        'seconds': best,
+        'throughput': workload.units / best,
+        'unit': workload.unit,
+        'peak_bytes': peak_memory(workload.run),
+    }
+
+def run_all(names, scale=1, repeat=5, report=print):
+    results = dict()
+    for name in names:
+        results[name] = measure(name, scale, repeat)
+        report("{:24} {:9.4f}s {:14.1f} {}/s {:10.1f} KB peak".format(name, results[name]['seconds'],
+                results[name]['throughput'], results[name]['unit'], results[name]['peak_bytes'] / 1024))
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'scale': scale,
+        'results': results,
+    }
+
+def compare(old, new, report=print):
+    """
+    Reports the change in throughput and peak memory of the benchmarks in both runs.
+    """
+    report("{} -> {}".format(old.get('commit'), new.get('commit')))
+    for name, result in sorted(new['results'].items()):
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        report("{:24} throughput {:7.2f}x  peak memory {:7.2f}x".format(name,
+                result['throughput'] / before['throughput'], result['peak_bytes'] / max(before['peak_bytes'], 1)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of each stage of the interpreter.")
+    parser.add_argument('names', nargs='*', help="benchmarks to run (those starting with these), all by default")
+    parser.add_argument('--scale', type=float, default=1, help="multiplies the work in each benchmark")
+    parser.add_argument('--repeat', type=int, default=5, help="runs to take the best time of")
+    parser.add_argument('--output', help="JSON file to save the results in")
+    parser.add_argument('--compare', help="JSON file of results to compare with")
+    args = parser.parse_args(argv)
+    names = [name for name in WORKLOADS if not args.names or any(name.startswith(n) for n in args.names)]
+    results = run_all(names, args.scale, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return results
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    main()
@@ -0,0 +1,156 @@
+"""
+Generated workloads for the benchmarks, the same on every run for a size.
+
+Each workload gets a `Workload` of the function to time (made ready by its
+setup, which isn't timed) and how many units of work one run of it is. The
+scale (1 by default) multiplies the work.
+"""
+import atexit
+import math
+import os
+import sys
+import tempfile
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bytecode as bc
+import context as ctxs
+import loader
+import tokenizer as tok
+from arithmetic import math_literals
+
+Workload = namedtuple('Workload', ['run', 'units', 'unit'])
+
+def make_context(evaluator=tok.evaluate_tree):
+    return ctxs.BaseContext(evaluator, tok.parse_type, math_literals())
+
+def flat_source(size):
+    """
+    About size bytes of top-level definitions, one after another.
+    """
+    form = "(def! some-rather-long-identifier{0}?F:float (x?F:float y) (if! (< x 1) 1 (* x (+ y 3.14159))))\n"
+    forms = []
+    length = 0
+    while length < size:
+        forms.append(form.format(len(forms)))
+        length += len(forms[-1])
+    return ''.join(forms)
+
+def nested_source(depth):
+    """
+    An expression nested depth forms deep: (+ 1 (+ 1 ... 0)).
+    """
+    return '(+ 1 ' * depth + '0' + ')' * depth
+
+def nested_type(depth):
+    """
+    A function type nested depth arrows deep, on the arguments.
+    """
+    typ = '?F:float'
+    for _ in range(depth):
+        typ = '?F:(-> {} ?F:float)'.format(typ)
+    return typ
+
+def annotated_source(count):
+    """
+    count definitions with every name and call annotated, each calling the last.
+    """
+    forms = ["(def! f0?F:float (x?F:float y?F:float) x?F:float)"]
+    for i in range(1, count):
+        forms.append("(def! f{0}?F:float (x?F:float y?F:float) (+ (f{1} x?F:float y)?F:float (* y 2)?F:float)?F:float)"
+                .format(i, i - 1))
+    return '\n'.join(forms)
+
+FIB = "(def! fib?F:float (n?F:float) (if! (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))"
+LOOP = "(def! loop?F:float (n?F:float acc?F:float) (if! (< n 1) acc (loop (- n 1) (+ acc n))))"
+
+def parsed(source, ctx):
+    return tok.parse_program(list(tok.tokenize(source)), ctx)
+
+def scaled(count, scale):
+    return max(1, int(count * scale))
+
+def tokenize(scale):
+    source = flat_source(scaled(1 << 20, scale))
+    return Workload(lambda: sum(1 for _ in tok.tokenize(source)), len(source) / (1 << 20), 'MB')
+
+def parse(scale):
+    ctx = make_context()
+    tokens = list(tok.tokenize(flat_source(scaled(1 << 19, scale))))
+    return Workload(lambda: tok.parse_program(tokens, ctx), len(tokens), 'tokens')
+
+def parse_type(scale):
+    ctx = make_context()
+    tokens = list(tok.tokenize(nested_type(100)))
+    count = scaled(200, scale)
+    def run():
+        for _ in range(count):
+            tok.parse_type(tokens, ctx, 0)
+    return Workload(run, count * 101, 'types')
+
+def check(scale):
+    ctx = make_context()
+    nodes = parsed(annotated_source(scaled(2000, scale)), ctx)
+    def run():
+        for node in nodes:
+            ctx.check(node)
+    return Workload(run, len(nodes), 'definitions')
+
+def evaluate_nested(scale, evaluator=tok.evaluate_tree):
+    ctx = make_context(evaluator)
+    node = ctx.check(parsed(nested_source(200), ctx)[0])
+    count = scaled(100, scale)
+    def run():
+        for _ in range(count):
+            evaluator(node, ctx)
+    return Workload(run, count * 200, 'calls')
+
+def evaluate_recursive(scale, evaluator=tok.evaluate_tree):
+    ctx = make_context(evaluator)
+    for node in parsed(FIB, ctx):
+        evaluator(ctx.check(node), ctx)
+    # the calls grow by the golden ratio with n
+    n = max(2, 15 + round(math.log(scale, 1.618)))
+    node = ctx.check(parsed("(fib {})".format(n), ctx)[0])
+    return Workload(lambda: evaluator(node, ctx), fib_calls(n), 'calls')
+
+def fib_calls(n):
+    """
+    The number of calls to fib that (fib n) makes.
+    """
+    a, b = 1, 1
+    for _ in range(n):
+        a, b = b, a + b + 1
+    return a
+
+def evaluate_loop(scale, evaluator=tok.evaluate_tree):
+    ctx = make_context(evaluator)
+    for node in parsed(LOOP, ctx):
+        evaluator(ctx.check(node), ctx)
+    n = scaled(5000, scale)
+    node = ctx.check(parsed("(loop {} 0)".format(n), ctx)[0])
+    return Workload(lambda: evaluator(node, ctx), n, 'calls')
+
+def load(scale):
+    source = flat_source(scaled(1 << 19, scale))
+    with tempfile.NamedTemporaryFile('w', suffix='.sem', delete=False) as f:
+        f.write(source)
+    atexit.register(os.remove, f.name)
+    return Workload(lambda: loader.load_file(f.name, make_context), len(source) / (1 << 20), 'MB')
+
+WORKLOADS = {
+    'tokenize': tokenize,
+    'parse': parse,
+    'parse_type/nested': parse_type,
+    'check/annotated': check,
+    'evaluate_tree/nested': evaluate_nested,
+    'evaluate_stack/nested': lambda scale: evaluate_nested(scale, tok.evaluate_stack),
+    'bytecode/nested': lambda scale: evaluate_nested(scale, bc.evaluate),
+    'evaluate_tree/fib': evaluate_recursive,
+    'evaluate_stack/fib': lambda scale: evaluate_recursive(scale, tok.evaluate_stack),
+    'bytecode/fib': lambda scale: evaluate_recursive(scale, bc.evaluate),
+    'evaluate_tree/loop': evaluate_loop,
+    'bytecode/loop': lambda scale: evaluate_loop(scale, bc.evaluate),
+    'load': load,
+}
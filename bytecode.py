@@ -0,0 +1,360 @@
+"""
+An optional backend for `context.BaseContext`: trees resolved by the context
+(and ideally checked, see `BaseContext.check`) are compiled to bytecode, which
+is run on a stack machine rather than by walking the tree.
+
+It is selected by making the context with `evaluate` as its evaluator. `def!`,
+`defmemo!`, `if!`, variables, constants and calls are compiled; anything else (like trees
+that weren't resolved or other special forms) is left to `tokenizer.evaluate_tree`.
+
+Each instruction is two ints in an array: the opcode and its argument, which is
+often an index into the constants of the code.
+"""
+from array import array
+from collections import namedtuple
+
+import tokenizer as tok
+from context import Environment, Memoized
+from sem_lang_types import Function, SpecialForm, ANY
+from syntax_tree import Atom, Form, Const, Var, Scope, CheckedForm
+
+LOAD_CONST = 0
+LOAD_LOCAL = 1
+LOAD_DEREF = 2
+LOAD_GLOBAL = 3
+LITERAL = 4
+CHECK = 5
+CALL = 6
+CALL_CHECKED = 7
+TAIL_CALL = 8
+TAIL_CALL_CHECKED = 9
+JUMP_IF_FALSE = 10
+JUMP = 11
+MAKE_FUNCTION = 12
+STORE_LOCAL = 13
+STORE_NAME = 14
+RETURN = 15
+EVAL_TREE = 16
+
+OPNAMES = {value: name for name, value in globals().items() if name.isupper() and isinstance(value, int)}
+
+class Code:
+    """
+    Compiled code: the instructions and the constants they refer to.
+    """
+    __slots__ = ('ops', 'consts')
+    def __init__(self, ops, consts):
+        self.ops = ops
+        self.consts = consts
+    def disassemble(self):
+        """
+        Gets the instructions as (opcode name, argument) pairs.
+        """
+        return [(OPNAMES[self.ops[i]], self.ops[i + 1]) for i in range(0, len(self.ops), 2)]
+
+FunctionTemplate = namedtuple('FunctionTemplate', ['name', 'gen', 'code', 'names', 'unset', 'checked_return', 'memoized'])
+
+class CompiledClosure:
+    """
+    What the functions made by compiled `def!`s are bound to: the compiled
+    body with the environment the function was defined in.
+    """
+    __slots__ = ('template', 'env', 'context')
+    def __init__(self, template, env, context):
+        self.template = template
+        self.env = env
+        self.context = context
+    def __call__(self, *args):
+        template = self.template
+        env = Environment(list(args) + template.unset, self.env, template.names)
+        if self.context.budget is not None:
+            self.context.budget.allocate(len(template.names))
+        return run(template.code, env, self.context)
+
+class Compiler:
+    """
+    Compiles trees resolved by the context to `Code`.
+    """
+    def __init__(self, context):
+        self.context = context
+        self.ops = array('l')
+        self.consts = []
+
+    def code(self):
+        return Code(self.ops, self.consts)
+
+    def const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def emit(self, op, arg=0):
+        """
+        Adds the instruction, returning where its argument is (for patching jumps).
+        """
+        self.ops.append(op)
+        self.ops.append(arg)
+        return len(self.ops) - 1
+
+    def expr(self, node, tail, names):
+        """
+        Compiles the node to leave its value on the stack or, in tail position,
+        to return it.
+
+        Args:
+          node = the resolved tree.
+          tail = whether the node is in tail position.
+          names = the names in the slots of the scope of the node (None at the top level).
+        """
+        if node.annotation is not None:
+            self.expr(node._replace(annotation=None), False, names)
+            self.emit(CHECK, self.const(node.annotation))
+        elif isinstance(node, Const):
+            self.emit(LOAD_CONST, self.const(node.value))
+        elif isinstance(node, Var):
+            if isinstance(node.slot, str):
+                self.emit(LOAD_GLOBAL, self.const(node.slot))
+            elif node.depth == 0:
+                self.emit(LOAD_LOCAL, node.slot)
+            else:
+                self.emit(LOAD_DEREF, self.const((node.depth, node.slot)))
+        elif isinstance(node, Atom):
+            self.emit(LITERAL, self.const(node.token))
+        elif isinstance(node, Form) and node.children and isinstance(node.head, Var):
+            self.call(node, tail, names)
+            return
+        elif isinstance(node, Form) and node.children and isinstance(node.head, Const):
+            head = node.head.value
+            if not isinstance(head, SpecialForm):
+                self.call(node, tail, names)
+                return
+            if head.name == 'if!' and len(node.args) == 3:
+                self.if_form(node, tail, names)
+                return
+            if head.name not in ('def!', 'defmemo!') or not self.def_form(node, names):
+                self.emit(EVAL_TREE, self.const(node))
+        else:
+            self.emit(EVAL_TREE, self.const(node))
+        if tail:
+            self.emit(RETURN)
+
+    def call(self, node, tail, names):
+        for child in node.children:
+            self.expr(child, False, names)
+        if type(node) is CheckedForm:
+            self.emit(TAIL_CALL_CHECKED if tail else CALL_CHECKED, len(node.args))
+        else:
+            self.emit(TAIL_CALL if tail else CALL, len(node.args))
+
+    def if_form(self, node, tail, names):
+        cond, then, otherwise = node.args
+        self.expr(cond, False, names)
+        to_otherwise = self.emit(JUMP_IF_FALSE)
+        self.expr(then, tail, names)
+        if not tail:
+            to_end = self.emit(JUMP)
+        self.ops[to_otherwise] = len(self.ops)
+        self.expr(otherwise, tail, names)
+        if not tail:
+            self.ops[to_end] = len(self.ops)
+
+    def def_form(self, node, names):
+        """
+        Compiles a `def!` (or `defmemo!`) with a resolved body, if it parses.
+
+        Returns:
+          bool = whether it was compiled.
+        """
+        name_node, params, body = node.args
+        if not isinstance(body, Scope):
+            return False
+        try:
+            name = self.context.special_forms.parse_name(name_node)
+            args = self.context.special_forms.parse_names(params)
+        except ValueError:
+            # left to fail when evaluated
+            return False
+        compiler = Compiler(self.context)
+        compiler.expr(body.body, True, body.names)
+        template = FunctionTemplate(name.name, tuple(arg.tag for arg in args) + (name.tag,), compiler.code(),
+                body.names, [None] * (len(body.names) - len(args)), body.checked, node.head.value.name == 'defmemo!')
+        self.emit(MAKE_FUNCTION, self.const(template))
+        if names is not None and name.name in names:
+            self.emit(STORE_LOCAL, names.index(name.name))
+        else:
+            self.emit(STORE_NAME, self.const(name.name))
+        return True
+
+max_compiled = 1 << 12
+# id of the tree -> (tree, code)
+compiled = dict()
+
+def compile_tree(node, context):
+    """
+    Gets the code for the tree (compiled once, for up to `max_compiled` trees).
+    """
+    cached = compiled.get(id(node))
+    if cached is not None and cached[0] is node:
+        return cached[1]
+    compiler = Compiler(context)
+    compiler.expr(node, True, None)
+    if len(compiled) >= max_compiled:
+        compiled.clear()
+    compiled[id(node)] = (node, compiler.code())
+    return compiled[id(node)][1]
+
+def evaluate(node, context):
+    """
+    Evaluate the tree in the context (a `BaseContext`) by compiling it and
+    running the bytecode. This is an evaluator, so it can be passed to the
+    context to use this backend.
+
+    Raises: (Note that the context may raise exceptions too)
+      ValueError = a type error.
+    Returns:
+      The evaluation of the code.
+    """
+    return run(compile_tree(node, context), context.lexical_vars, context)
+
+def run(code, env, context):
+    """
+    Runs the code with the variables in the environment. Calls to compiled
+    functions are run in this loop (so tail calls take no space).
+    """
+    try:
+        next(execute(code, env, context))
+    except StopIteration as done:
+        return done.value
+
+def execute(code, env, context, every=None):
+    """
+    Runs the code (see `run`) as a generator that can be paused: it yields
+    before every every-th call and returns the value of the code (as the value
+    of the StopIteration). Never yields if every is None.
+
+    Calls made from python (like the functions a builtin calls) run in full
+    without yielding.
+    """
+    countdown = every
+    root = env
+    while root.parent is not None:
+        root = root.parent
+    global_vars = root.frame
+    budget = context.budget
+    ops, consts = code.ops, code.consts
+    pc = 0
+    checks = None
+    stack = []
+    frames = []
+    while True:
+        op = ops[pc]
+        arg = ops[pc + 1]
+        pc += 2
+        if op == LOAD_LOCAL:
+            value = env.frame[arg]
+            if value is None:
+                raise ValueError("{} is not bound".format(env.names[arg]))
+            stack.append(value)
+            continue
+        elif op == LOAD_CONST:
+            stack.append(consts[arg])
+            continue
+        elif op == LOAD_GLOBAL:
+            value = global_vars.get(consts[arg])
+            if value is None:
+                raise ValueError("{} is not bound".format(consts[arg]))
+            stack.append(value)
+            continue
+        elif op == JUMP_IF_FALSE:
+            if not stack.pop():
+                pc = arg
+            continue
+        elif op == JUMP:
+            pc = arg
+            continue
+        elif op == RETURN:
+            value = stack.pop()
+        elif op <= TAIL_CALL_CHECKED and op >= CALL:
+            if arg:
+                args = stack[-arg:]
+                del stack[-arg:]
+            else:
+                args = []
+            fn = stack.pop()
+            if type(fn) is not Function:
+                raise ValueError("Non-function {} passed in".format(fn))
+            if budget is not None:
+                budget.step()
+            if countdown is not None:
+                countdown -= 1
+                if countdown <= 0:
+                    countdown = every
+                    yield
+            if op == CALL or op == TAIL_CALL:
+                fn.check_args(args)
+            binding = fn.binding
+            if type(binding) is CompiledClosure:
+                template = binding.template
+                check = None if fn.checked_return or fn.gen[-1] is ANY else fn.gen[-1]
+                if op == CALL or op == CALL_CHECKED:
+                    frames.append((ops, consts, pc, env, checks))
+                    checks = None
+                if check is not None and (not checks or checks[-1] is not check):
+                    checks = (checks or []) + [check]
+                ops, consts, pc = template.code.ops, template.code.consts, 0
+                env = Environment(args + template.unset, binding.env, template.names)
+                if budget is not None:
+                    budget.allocate(len(template.names))
+                continue
+            value = fn.check_return(binding(*args))
+            if budget is not None:
+                budget.allocate_value(value)
+            if op == CALL or op == CALL_CHECKED:
+                stack.append(value)
+                continue
+        elif op == LOAD_DEREF:
+            depth, slot = consts[arg]
+            scope = env
+            for _ in range(depth):
+                scope = scope.parent
+            value = scope.frame[slot]
+            if value is None:
+                raise ValueError("{} is not bound".format(scope.names[slot]))
+            stack.append(value)
+            continue
+        elif op == CHECK:
+            if not context.validate_type(stack[-1], *consts[arg]):
+                raise ValueError("type error in the code")
+            continue
+        elif op == MAKE_FUNCTION:
+            if budget is not None:
+                budget.step()
+            template = consts[arg]
+            fn = Function(template.gen, CompiledClosure(template, env, context), template.name)
+            if template.memoized:
+                fn.binding = Memoized(fn.binding, context.memo)
+            fn.checked_return = template.checked_return
+            stack.append(fn)
+            continue
+        elif op == STORE_LOCAL:
+            env.frame[arg] = stack[-1]
+            continue
+        elif op == STORE_NAME:
+            env[consts[arg]] = stack[-1]
+            continue
+        elif op == LITERAL:
+            stack.append(context.in_environment(env).literal(consts[arg]))
+            continue
+        elif op == EVAL_TREE:
+            stack.append(tok.evaluate_tree(consts[arg], context.in_environment(env)))
+            continue
+        else:
+            raise ValueError("Unknown opcode {}".format(op))
+        # returning the value
+        if checks:
+            for check in reversed(checks):
+                if not check.validate(value):
+                    raise ValueError("Type error in the return: {} is not a {}".format(value, check))
+        if not frames:
+            return value
+        ops, consts, pc, env, checks = frames.pop()
+        stack.append(value)
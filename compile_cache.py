@@ -0,0 +1,128 @@
+"""
+A cache of the parsed (and resolved) programs in source files, like python's
+`__pycache__`, so loading a file that hasn't changed skips tokenizing and parsing.
+
+The trees of a file are pickled into `__semcache__/<file name>.semc` beside it,
+after a header with the hash of the source and of what the trees depend on (the
+version of the format and the interpreter, and the special forms of the context).
+The cache is read through an mmap and is recompiled when the hash doesn't match.
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import sys
+
+import tokenizer as tok
+from sem_lang_types import SpecialForm
+
+MAGIC = b'SEMC'
+# bump when the syntax tree (or how it is resolved) changes
+FORMAT_VERSION = 1
+CACHE_DIR = '__semcache__'
+HEADER_SIZE = len(MAGIC) + hashlib.sha256().digest_size
+
+def cache_key(source, context, resolve):
+    """
+    Gets the hash the cached trees of the source (bytes) are kept under.
+    """
+    signature = '{}:{}:{}.{}:{}:{}'.format(FORMAT_VERSION, sys.implementation.cache_tag,
+            type(context).__module__, type(context).__qualname__,
+            ','.join(sorted(context.special_forms.forms)) if resolve else '',
+            resolve and context.lexical_vars.parent is None)
+    return hashlib.sha256(signature.encode('utf-8') + b'\0' + source).digest()
+
+def cache_path(path, cache_dir=None):
+    """
+    Gets where the trees of the source file are cached.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(cache_dir or os.path.join(directory, CACHE_DIR), name + '.semc')
+
+class TreePickler(pickle.Pickler):
+    """
+    Pickles trees, keeping special forms (which belong to a context) by name.
+    """
+    def persistent_id(self, obj):
+        if isinstance(obj, SpecialForm):
+            return obj.name
+        return None
+
+class TreeUnpickler(pickle.Unpickler):
+    """
+    Unpickles trees, getting special forms from the context.
+    """
+    def __init__(self, file, context):
+        super().__init__(file)
+        self.context = context
+    def persistent_load(self, name):
+        return self.context.special_forms[name]
+
+def compile_source(source, context, resolve=True):
+    """
+    Parses (and resolves, if resolve is true) every expression in the source.
+
+    Returns:
+      tuple of the syntax trees, in order.
+    """
+    nodes = tok.parse_program(list(tok.tokenize(source)), context)
+    if resolve:
+        nodes = tuple(context.resolve(node) for node in nodes)
+    return nodes
+
+def read_cache(path, key, context):
+    """
+    Gets the trees cached in the file if they are under the key, otherwise None.
+    """
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:HEADER_SIZE] != MAGIC + key:
+                return None
+            data.seek(HEADER_SIZE)
+            return TreeUnpickler(data, context).load()
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, KeyError):
+        # missing, empty or corrupt: compiled again
+        return None
+
+def write_cache(path, key, nodes):
+    """
+    Writes the trees to the cache file (atomically), if it can be written.
+    """
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + key)
+            TreePickler(f, pickle.HIGHEST_PROTOCOL).dump(nodes)
+        os.replace(tmp, path)
+    except OSError:
+        # like __pycache__, a cache that can't be written is no error
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def load_program(path, context, resolve=True, cache_dir=None):
+    """
+    Gets the syntax trees of the source file (see `compile_source`), from
+    its cache if it was compiled before and hasn't changed since.
+
+    Args:
+      path = the source file.
+      context = the context the program is to be evaluated in.
+      resolve (default True) = whether to resolve the trees in the context.
+      cache_dir (default `__semcache__` beside the file) = where to cache the trees.
+    Raises:
+      ValueError = parsing issues with the source.
+    Returns:
+      tuple of the syntax trees, in order.
+    """
+    with open(path, 'rb') as f:
+        source = f.read()
+    key = cache_key(source, context, resolve)
+    cached = cache_path(path, cache_dir)
+    nodes = read_cache(cached, key, context)
+    if nodes is None:
+        nodes = compile_source(source.decode('utf-8'), context, resolve)
+        write_cache(cached, key, nodes)
+    return nodes
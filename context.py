@@ -3,7 +3,10 @@ Defines the base context which
 includes the general interfaces for defining
 contexts and types therein.
 """
+from collections import namedtuple, OrderedDict
+
 from sem_lang_types import *
+from syntax_tree import Atom, Form, Const, Var, Scope, CheckedForm
 
 class AbstractContext:
     """
@@ -24,6 +27,8 @@ class AbstractContext:
     def call(self, fn: str, *args):
         """
         Function call on evaluated arguments.
+        The result may be a `Tail` for the evaluator to finish,
+        so that calls in tail position take no stack.
 
         Args:
           fn: str = is an unevaluated string literal
@@ -68,81 +73,634 @@ class AbstractContext:
           bool = whether the evaluated literal should create an abstraction.
         """
         pass
-    def eval(self, tokens, index, name=None, finalize=False):
+    def eval(self, node, name=None, finalize=False):
         """
         Evaluator used in parsing special forms.
 
-        The name is a way to inform the context of which special form.
-        It being none implies that the evaluation was started within a
-        special form.
+        The name is a way to inform the context of which special form
+        the node (a `syntax_tree.Form`) is using: it's the special form
+        as evaluated (by `literal`). It being none implies
+        that the evaluation was started within a special form and that
+        the node is just an expression to evaluate.
 
         finalize being true means that the context is expected to output
         a readable, more user-friendly type instead of a potentially internal
         one
+
+        Like `call`, special forms may give back a `Tail` when there is no name.
         """
         pass
     def eval_type(self, tokens, index):
         pass
+    def resolve(self, node):
+        """
+        Gets a tree that evaluates like the node given but in which atoms are
+        classified up front as constants or variables addressed by scope depth
+        and slot (see `syntax_tree`), so that `literal` needn't be called on
+        them each evaluation. By default nothing is resolved.
+        """
+        return node
+    def lookup(self, depth, slot):
+        """
+        Gets the value of a variable resolved by `resolve`.
+        """
+        pass
+    def check(self, node):
+        """
+        Gets a tree that evaluates like the node given but in which what is
+        proven to type check up front is marked so as not to be validated
+        again when evaluated (see `syntax_tree.CheckedForm`). By default nothing
+        is proven.
+
+        Raises:
+          ValueError = for code that can't type check.
+        """
+        return node
+    # the `Budget` evaluation is limited to, if any
+    budget = None
+    def call_checked(self, fn, *args):
+        """
+        Like `call`, but the arguments are known to type check.
+        """
+        return self.call(fn, *args)
+
+class Environment:
+    """
+    The variables in scope: a (small) frame of the variables bound
+    in the innermost scope and a pointer to the environment around it.
+    Making a scope is then constant time rather than a copy of every
+    variable in the enclosing scopes.
+
+    A frame is either a dictionary of names to values or a list of values
+    with the names of the slots given separately (see `BaseContext.resolve`).
+    """
+    __slots__ = ('frame', 'parent', 'names')
+    def __init__(self, frame=None, parent=None, names=None):
+        self.frame = dict() if frame is None else frame
+        self.parent = parent
+        self.names = names
+    def get(self, name, default=None):
+        env = self
+        while env is not None:
+            if env.names is None:
+                if name in env.frame:
+                    return env.frame[name]
+            elif name in env.names:
+                return env.frame[env.names.index(name)]
+            env = env.parent
+        return default
+    def address(self, depth, slot):
+        """
+        Gets the value in the slot of the frame depth scopes out.
+        """
+        env = self
+        for _ in range(depth):
+            env = env.parent
+        return env.frame[slot]
+    def __getitem__(self, name):
+        rv = self.get(name, self)
+        if rv is self:
+            raise KeyError(name)
+        return rv
+    def __contains__(self, name):
+        return self.get(name, self) is not self
+    def __setitem__(self, name, value):
+        """
+        Binds in the innermost scope.
+        """
+        if self.names is None:
+            self.frame[name] = value
+        else:
+            self.frame[self.names.index(name)] = value
+    def child(self, frame, names=None):
+        return Environment(frame, self, names)
+
+class Closure:
+    """
+    What the functions made by `def!` are bound to: the body to evaluate
+    in a scope, within the context the function was defined in, that binds
+    the arguments.
+    """
+    __slots__ = ('context', 'names', 'body', 'unset')
+    def __init__(self, context, names, body):
+        self.context = context
+        if isinstance(body, Scope):
+            self.names, self.body = body.names, body.body
+            self.unset = [None] * (len(self.names) - len(names))
+        else:
+            self.names, self.body, self.unset = names, body, None
+    def enter(self, values):
+        """
+        Gets the context for the body with the values bound to the arguments.
+        """
+        if self.context.budget is not None:
+            self.context.budget.allocate(len(self.names))
+        if self.unset is None:
+            return self.context.child(dict(zip(self.names, values)))
+        return self.context.child(list(values) + self.unset, self.names)
+    def tail(self, *values):
+        return Tail(self.body, self.enter(values))
+    def __call__(self, *values):
+        return self.tail(*values).finish()
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a program goes over its `Budget`. It isn't a ValueError, so
+    it isn't mistaken for an error in the program.
+    """
+    def __init__(self, resource, limit):
+        super().__init__("Over budget: the program took more than {} {}".format(limit, resource))
+        self.resource = resource
+        self.limit = limit
+
+class Budget:
+    """
+    What a program may use, to stop one that runs away (see `BaseContext.budget`).
+
+    Steps are calls and special forms evaluated: without them, a program can only
+    take as long as it is. Allocations are the slots of the scopes that calls open
+    and the elements of the lists (and entries in the maps) calls return. None is
+    no limit.
+    """
+    __slots__ = ('steps', 'allocations', 'max_steps', 'max_allocations')
+    def __init__(self, max_steps=None, max_allocations=None):
+        self.max_steps = max_steps
+        self.max_allocations = max_allocations
+        self.steps = 0
+        self.allocations = 0
+    def step(self):
+        self.steps += 1
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise BudgetExceeded('steps', self.max_steps)
+    def allocate(self, count):
+        self.allocations += count
+        if self.max_allocations is not None and self.allocations > self.max_allocations:
+            raise BudgetExceeded('allocations', self.max_allocations)
+    def allocate_value(self, value):
+        """
+        Allocates what the value is made of, if it's a list or a map.
+        """
+        if type(value) is List:
+            self.allocate(len(value))
+        elif type(value) is HashMap:
+            # the rest is shared with the map it was made from
+            self.allocate(1)
+
+MemoInfo = namedtuple('MemoInfo', ['hits', 'misses', 'max_size', 'size'])
+
+class Memo:
+    """
+    The results of memoized calls (see `Memoized`), keeping the most
+    recently used max_size of them.
+    """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    def get(self, key, default=None):
+        rv = self.results.get(key, default)
+        if rv is default:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return rv
+    def put(self, key, value):
+        self.results[key] = value
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+    def info(self):
+        return MemoInfo(self.hits, self.misses, self.max_size, len(self.results))
+    def clear(self):
+        self.results.clear()
+        self.hits = self.misses = 0
+
+class TypeTable:
+    """
+    The semantics and types resolved in a context (see `BaseContext.get_type`),
+    so that each distinct one is resolved once. It must be invalidated when the
+    definition of semantics or a type changes.
+    """
+    def __init__(self):
+        # name -> semantics
+        self.semantics = dict()
+        # (semantics, name, generic args) -> tag
+        self.types = dict()
+        self.hits = 0
+        self.misses = 0
+        # the number of invalidations
+        self.generation = 0
+    def invalidate(self):
+        self.semantics.clear()
+        self.types.clear()
+        self.generation += 1
+
+class Memoized:
+    """
+    A binding that remembers what it gave for arguments that are all
+    floats, strings or bools, so it had better be pure. Memoized calls are
+    evaluated in full (not as tails), so they recurse.
+    """
+    __slots__ = ('binding', 'memo')
+    def __init__(self, binding, memo):
+        self.binding = binding
+        self.memo = memo
+    def __call__(self, *values):
+        types = tuple(type(value) for value in values)
+        if not all(typ in UNBOXED_TAGS for typ in types):
+            return self.binding(*values)
+        # the types keep 1.0 and True apart
+        key = (self.binding, values, types)
+        rv = self.memo.get(key)
+        if rv is None:
+            rv = self.binding(*values)
+            self.memo.put(key, rv)
+        return rv
+
+# what a name not bound in an environment gets (values may be None)
+_unbound = object()
 
 class BaseContext(AbstractContext):
-    def __init__(self, evaluator, type_evaluator, lexical_vars):
-        def bind_fn_off_special_form(name, args, body):
-            def binding_fn(*py_args):
-                new_vars = self.lexical_vars.copy()
-                for arg in args:
-                    new_vars[arg.name] = arg
-                # allow recursion
-                new_vars[name] = Function(binding_fn, args, name)
-                new_context = BaseContext(evaluator, new_vars)
-                return evaluator(body, new_context)
-            self.lexical_vars[name] = Function(binding_fn, args, name)
-            return self.lexical_vars[name]
+    """
+    The basic context: the variables in scope are an `Environment`
+    of names to (bound) types and `if!`, `def!` and `defmemo!` are the
+    special forms. `defmemo!` is `def!` for pure functions: their results are
+    remembered in the context's memo (up to memo_size of them, see `Memo`).
+    The semantics and types named in annotations are looked up once in the
+    context's `TypeTable`.
 
+    The evaluator is a tree evaluator (like `tokenizer.evaluate_tree`)
+    and the type evaluator a type parser (like `tokenizer.parse_type`).
+    """
+    def __init__(self, evaluator, type_evaluator, lexical_vars, memo_size=1024):
+        if not isinstance(lexical_vars, Environment):
+            lexical_vars = Environment({name: unbox(value) for name, value in lexical_vars.items()})
         self.lexical_vars = lexical_vars
         self.evaler = evaluator
         self.type_evaler = type_evaluator
         self.special_forms = SpecialFormFactory(['(', ')', '?', ':'])
-        self.special_forms('if!',
-                lambda c, t, e: evaluator(t, self) if c else evaluator(e, self),
+        self.special_forms('if!', BaseContext.if_special_form,
                 SpecialFormSpec.EVALED_EXPR, SpecialFormSpec.EXPR, SpecialFormSpec.EXPR)
-        self.special_forms('def!', bind_fn_off_special_form,
+        self.special_forms('def!', BaseContext.bind_fn_off_special_form,
+                SpecialFormSpec.NAME, SpecialFormSpec.LIST_OF_NAME, SpecialFormSpec.EXPR)
+        self.special_forms('defmemo!', BaseContext.memo_fn_off_special_form,
                 SpecialFormSpec.NAME, SpecialFormSpec.LIST_OF_NAME, SpecialFormSpec.EXPR)
+        self.memo = Memo(memo_size)
+        self.type_table = TypeTable()
+        # the Budget calls and special forms are taken out of, if limited
+        self.budget = None
 
-    def literal(self, token):
+    def child(self, frame, names=None):
+        """
+        Gets a context for a scope within this one, binding the variables
+        in the frame (see `Environment`). Everything but the variables (like
+        the special forms) is shared with this context.
+        """
+        return self.in_environment(self.lexical_vars.child(frame, names))
+
+    def in_environment(self, env):
+        """
+        Gets a context like this one but with the variables in the environment.
+        """
+        rv = self.__class__.__new__(self.__class__)
+        rv.__dict__.update(self.__dict__)
+        rv.lexical_vars = env
+        return rv
+
+    def if_special_form(self, cond, then, otherwise):
+        return Tail(then if cond else otherwise, self)
+
+    def bind_fn_off_special_form(self, name, args, body):
+        # the annotation on the name is the return type.
+        gen = tuple(arg.tag for arg in args) + (name.tag,)
+        closure = Closure(self, [arg.name for arg in args], body)
+        self.lexical_vars[name.name] = Function(gen, closure, name.name)
+        self.lexical_vars[name.name].checked_return = isinstance(body, Scope) and body.checked
+        return self.lexical_vars[name.name]
+
+    def memo_fn_off_special_form(self, name, args, body):
+        fn = self.bind_fn_off_special_form(name, args, body)
+        fn.binding = Memoized(fn.binding, self.memo)
+        return fn
+
+    def classify(self, token):
+        """
+        Gets the value of a token that isn't a variable.
+        """
+        if token.startswith('"') and token.endswith('"'):
+            return token[1:len(token) - 1]
+        return float(token)
+
+    def resolve(self, node, scopes=None):
+        """
+        Resolves the tree (see `AbstractContext.resolve`). Literals become
+        constants and variables bound in the scopes opened by special forms
+        (like the arguments of a `def!`) are addressed by slot. Other names are
+        looked up by name in the global scope if this is the top-level context
+        and are left alone otherwise.
+
+        Args:
+          node = the tree to resolve.
+          scopes = the names in each scope around the node, innermost last.
+        """
+        if scopes is None:
+            scopes = []
+        if isinstance(node, Atom):
+            return self.resolve_atom(node, scopes)
+        if not isinstance(node, Form) or not node.children:
+            return node
+        head = node.head
+        if isinstance(head, Atom) and head.token in self.special_forms \
+                and not any(head.token in scope for scope in scopes):
+            return node._replace(children=(self.resolve_atom(head, scopes),)
+                    + self.resolve_special_form(head.token, node.args, scopes))
+        return node._replace(children=tuple(self.resolve(child, scopes) for child in node.children))
+
+    def resolve_atom(self, node, scopes):
+        token = node.token
+        if token in self.special_forms:
+            return Const(self.special_forms[token], node.annotation)
+        for depth, scope in enumerate(reversed(scopes)):
+            if token in scope:
+                return Var(token, depth, scope.index(token), node.annotation)
+        # names that are bound come before literals, as in `literal`
         if token in self.lexical_vars:
-            return self.lexical_vars[token]
-        elif token.startswith('"') and token.endswith('"'):
-            return String(binding=token[1:len(token) - 1])
-        else:
-            return Float(binding=token)
+            if self.lexical_vars.parent is None:
+                return Var(token, len(scopes), token, node.annotation)
+            return node
+        try:
+            return Const(self.classify(token), node.annotation)
+        except ValueError:
+            pass
+        if self.lexical_vars.parent is None:
+            return Var(token, len(scopes), token, node.annotation)
+        return node
+
+    def resolve_special_form(self, name, args, scopes):
+        specs = self.special_forms.specs[name]
+        if len(specs) != len(args):
+            # left for the special form to complain about
+            return args
+        resolved = []
+        inner = None
+        for spec, arg in zip(specs, args):
+            if spec == SpecialFormSpec.NAME:
+                if scopes and isinstance(arg, Atom) and arg.token not in scopes[-1]:
+                    scopes[-1].append(arg.token)
+                resolved.append(arg)
+            elif spec == SpecialFormSpec.LIST_OF_NAME:
+                inner = [n.token for n in arg.children if isinstance(n, Atom)] \
+                        if isinstance(arg, Form) else []
+                resolved.append(arg)
+            elif inner is None:
+                resolved.append(self.resolve(arg, scopes))
+            else:
+                inner_scopes = scopes + [inner]
+                self.collect_names(arg, inner)
+                resolved.append(Scope(tuple(inner), self.resolve(arg, inner_scopes)))
+        return tuple(resolved)
+
+    def collect_names(self, node, names):
+        """
+        Adds the names that special forms in the node bind in its scope to the
+        list, so that uses before the binding are addressed right too.
+        """
+        if not isinstance(node, Form) or not node.children:
+            return
+        head = node.head
+        if not (isinstance(head, Atom) and head.token in self.special_forms):
+            for child in node.children:
+                self.collect_names(child, names)
+            return
+        specs = self.special_forms.specs[head.token]
+        for spec, arg in zip(specs, node.args):
+            if spec == SpecialFormSpec.LIST_OF_NAME:
+                # the rest is in another scope
+                return
+            if spec == SpecialFormSpec.NAME:
+                if isinstance(arg, Atom) and arg.token not in names:
+                    names.append(arg.token)
+            else:
+                self.collect_names(arg, names)
+
+    def lookup(self, depth, slot):
+        try:
+            rv = self.lexical_vars.address(depth, slot)
+        except KeyError:
+            rv = None
+        if rv is None:
+            raise ValueError("{} is not bound".format(slot))
+        return rv
+
+    def literal(self, token):
+        if token in self.special_forms:
+            return self.special_forms[token]
+        value = self.lexical_vars.get(token, _unbound)
+        if value is not _unbound:
+            return value
+        return self.classify(token)
 
     def call(self, fn, *args):
         if type(fn) != Function:
             raise ValueError("Non-function {} passed in".format(fn))
-        return fn(*args)
+        if self.budget is None:
+            return fn.tail_call(*args)
+        return self.call_in_budget(fn, args, False)
+
+    def call_checked(self, fn, *args):
+        if self.budget is None:
+            return fn.tail_call(*args, checked=True)
+        return self.call_in_budget(fn, args, True)
+
+    def call_in_budget(self, fn, args, checked):
+        self.budget.step()
+        rv = fn.tail_call(*args, checked=checked)
+        self.budget.allocate_value(rv)
+        return rv
+
+    def check(self, node):
+        """
+        Resolves (see `resolve`) and then type checks the tree with the
+        annotations and the types of the functions in scope. Annotations that
+        are proven are dropped, calls proven to type check become `CheckedForm`s
+        and the bodies of `def!`s proven to give their return type are marked as
+        checked in their `Scope`.
+
+        Functions are assumed to keep their types (so redefining one with
+        another type is an error).
+
+        Raises:
+          ValueError = for code that can't type check.
+        Returns:
+          the checked tree.
+        """
+        node, _ = self.check_resolved(self.resolve(node), [], dict())
+        return node
+
+    def check_resolved(self, node, scopes, defined):
+        """
+        Checks a resolved tree.
+
+        Args:
+          node = the tree to check.
+          scopes = the names and the types of the slots in each scope around
+                   the node, innermost last.
+          defined = the types of the globals defined by the code checked so far.
+        Returns:
+          node, type = the checked tree and its type (a tag), `ANY` if it
+                       isn't known.
+        """
+        typ = None
+        if isinstance(node, Const):
+            typ = tag_of(node.value)
+        elif isinstance(node, Var):
+            if node.depth < len(scopes):
+                typ = scopes[-1 - node.depth][1][node.slot]
+            else:
+                typ = defined.get(node.name)
+                if typ is None and node.name in self.lexical_vars:
+                    typ = tag_of(self.lexical_vars[node.name])
+        elif isinstance(node, Form) and node.children:
+            node, typ = self.check_form(node, scopes, defined)
+        if typ is None:
+            typ = ANY
+        if node.annotation is not None:
+            expected = as_tag(node.annotation[1])
+            if expected.by_entries(typ):
+                # (a map of another map type is validated by its entries when evaluated)
+                typ = ANY
+            if typ is not ANY:
+                if typ is not expected:
+                    raise ValueError("Type error: expected {} not {}".format(expected, typ))
+                node = node._replace(annotation=None)
+            else:
+                # validated when evaluated
+                typ = expected
+        return node, typ
+
+    def check_form(self, node, scopes, defined):
+        head = node.head
+        if isinstance(head, Const) and self.is_special_form(head.value):
+            if head.value.name == 'if!' and len(node.args) == 3:
+                checked = [self.check_resolved(arg, scopes, defined) for arg in node.args]
+                then, otherwise = checked[1][1], checked[2][1]
+                typ = then if then is otherwise else ANY
+                return node._replace(children=(head,) + tuple(n for n, _ in checked)), typ
+            if head.value.name in ('def!', 'defmemo!') and len(node.args) == 3 and isinstance(node.args[2], Scope):
+                return self.check_def(node, scopes, defined)
+            # left to be validated as it is evaluated
+            return node, ANY
+        checked = [self.check_resolved(child, scopes, defined) for child in node.children]
+        node = node._replace(children=tuple(n for n, _ in checked))
+        fn = checked[0][1]
+        if fn.kind != '->':
+            if fn is not ANY:
+                raise ValueError("Type error: {} is not a function".format(fn))
+            return node, ANY
+        if len(checked) != len(fn.args):
+            raise ValueError("Arity incorrect, {} expected {} args.".format(fn, len(fn.args) - 1))
+        proven = True
+        for (_, typ), expected in zip(checked[1:], fn.args):
+            if expected is ANY or typ is expected:
+                continue
+            if typ is not ANY and not expected.by_entries(typ):
+                raise ValueError("Type error in invocation of {}: expected {} not {}".format(fn, expected, typ))
+            proven = False
+        if proven:
+            node = CheckedForm(node.children, node.annotation)
+        return node, fn.args[-1]
+
+    def check_def(self, node, scopes, defined):
+        name_node, params, body = node.args
+        name = self.special_forms.parse_name(name_node)
+        args = [self.special_forms.parse_name(param) for param in params.children]
+        typ = TypeTag('->', [arg.tag for arg in args] + [name.tag])
+        if scopes:
+            names, types = scopes[-1]
+            previous = types[names.index(name.name)]
+        else:
+            previous = defined.get(name.name)
+            if previous is None and name.name in self.lexical_vars:
+                previous = tag_of(self.lexical_vars[name.name])
+        if previous is not None and previous is not typ:
+            raise ValueError("Type error: {} cannot be redefined as another type".format(name.name))
+        if scopes:
+            types[names.index(name.name)] = typ
+        else:
+            defined[name.name] = typ
+        types = [arg.tag for arg in args] + [None] * (len(body.names) - len(args))
+        checked, returned = self.check_resolved(body.body, scopes + [(body.names, types)], defined)
+        if name.tag.by_entries(returned):
+            returned = ANY
+        if name.tag is not ANY and returned is not ANY and returned is not name.tag:
+            raise ValueError("Type error in the return of {}: expected {} not {}".format(name.name, name.tag, returned))
+        proven = name.tag is ANY or returned is not ANY
+        body = Scope(body.names, checked, proven)
+        return node._replace(children=node.children[:3] + (body,)), typ
 
     def get_semantics(self, name):
+        """
+        Gets the semantics (see `AbstractContext.get_semantics`) from the type
+        table, resolving them (see `resolve_semantics`) the first time.
+        """
+        table = self.type_table
+        try:
+            rv = table.semantics[name]
+        except KeyError:
+            table.misses += 1
+            rv = table.semantics[name] = self.resolve_semantics(name)
+            return rv
+        table.hits += 1
+        return rv
+    def get_type(self, semantics, name, *args):
+        """
+        Gets the type (see `AbstractContext.get_type`) from the type table,
+        resolving it (see `resolve_type`) the first time.
+        """
+        table = self.type_table
+        key = (semantics, name, tuple(as_tag(arg) for arg in args) if args else args)
+        rv = table.types.get(key)
+        if rv is None:
+            table.misses += 1
+            rv = table.types[key] = self.resolve_type(semantics, name, *args)
+            return rv
+        table.hits += 1
+        return rv
+    def resolve_semantics(self, name):
         # TODO: have semantics definitions
         return None
-    def get_type(self, semantics, name, *args):
+    def resolve_type(self, semantics, name, *args):
         if name == 'string':
-            return String()
+            return String.tag
         if name == 'float':
-            return Float()
+            return Float.tag
+        if name == 'any':
+            return ANY
         if name == '->':
-            return Function(args, None)
+            return TypeTag('->', args)
+        if name == 'list':
+            if len(args) != 1:
+                raise ValueError("list takes the type of its elements, not {} types".format(len(args)))
+            return TypeTag('list', args)
+        if name == 'hashmap':
+            if len(args) != 2:
+                raise ValueError("hashmap takes the types of its keys and values, not {} types".format(len(args)))
+            return TypeTag('hashmap', args)
         raise ValueError("Unknown type {} passed in".format(name))
     def validate_type(self, literal, semantics, typ):
-        return typ == literal
+        return typ.validate(literal)
     def is_special_form(self, literal):
-        return literal in self.special_forms
-    def eval(self, tokens, index, name=None, finalize=False):
+        return isinstance(literal, SpecialForm)
+    def eval(self, node, name=None, finalize=False):
         if name is None:
-            rv = self.evaler(tokens, index)
+            rv = self.evaler(node, self)
         else:
-            rv = self.special_forms[name].evaluate(tokens, self, index)
-        if finalize:
-            return rv.binding
+            if self.budget is not None:
+                self.budget.step()
+            rv = name.evaluate(node, self)
+        if isinstance(rv, Tail) and finalize:
+            rv = rv.finish()
         return rv
     def eval_type(self, tokens, index):
-        return self.type_evaler(tokens, index)
+        return self.type_evaler(tokens, self, index)
@@ -0,0 +1,53 @@
+"""
+Cooperative evaluation for asyncio: programs run on the bytecode VM (see
+`bytecode.execute`) a slice of calls at a time, giving the event loop back
+between slices, so that many programs can be interleaved in one thread.
+
+Cancelling the task evaluating a program (say with `asyncio.wait_for`) stops
+it between two slices. What runs in python rather than in the VM (parsing, a
+builtin and the functions it calls) isn't sliced.
+"""
+import asyncio
+
+import bytecode as bc
+import tokenizer as tok
+
+def steps(node, context, every=1000):
+    """
+    Gets a generator evaluating the resolved tree in the context, that yields
+    before every every-th call and returns the evaluation (see `bytecode.execute`).
+    """
+    return bc.execute(bc.compile_tree(node, context), context.lexical_vars, context, every)
+
+async def evaluate_async(node, context, every=1000):
+    """
+    Evaluates the resolved tree in the context (like `bytecode.evaluate`),
+    letting the other tasks run every every calls.
+
+    Raises:
+      asyncio.CancelledError = when cancelled (the evaluation is then dropped).
+    Returns:
+      The evaluation of the tree.
+    """
+    evaluation = steps(node, context, every)
+    try:
+        while True:
+            try:
+                next(evaluation)
+            except StopIteration as done:
+                return done.value
+            await asyncio.sleep(0)
+    finally:
+        evaluation.close()
+
+async def evaluate_source_async(source, context, every=1000):
+    """
+    Evaluates every expression in the source in the context (see `evaluate_async`).
+
+    Returns:
+      the value of the last expression (None for no expressions).
+    """
+    rv = None
+    for node in tok.parse_program(list(tok.tokenize(source)), context):
+        rv = await evaluate_async(context.resolve(node), context, every)
+    return rv
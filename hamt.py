@@ -0,0 +1,223 @@
+"""
+A persistent hash array mapped trie: an immutable map where assoc and dissoc
+give a new map sharing all but the O(log32 n) nodes on the path to the key with
+the old one (rather than copying the whole map).
+
+Each node covers 5 bits of the hash of the keys under it. A `BitmapNode` has a
+bitmap of which of its 32 slots are used and a tuple of just those slots, as
+key, value pairs in which a key of `NODE` means the value is a node one level
+down. Keys with the same hash go in a `CollisionNode`.
+"""
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+
+# the key of a slot holding a node
+NODE = object()
+
+def hash_of(key):
+    return hash(key) & HASH_MASK
+
+def bit_of(h, shift):
+    return 1 << ((h >> shift) & MASK)
+
+def index_of(bitmap, bit):
+    """
+    Gets where the key of the slot for the bit is in the tuple of a node.
+    """
+    return 2 * bin(bitmap & (bit - 1)).count('1')
+
+def make_node(shift, h1, key1, value1, h2, key2, value2):
+    """
+    Gets a node with the two entries, whose hashes agree below the shift.
+    """
+    if h1 == h2 or shift >= HASH_BITS:
+        return CollisionNode(h1, (key1, value1, key2, value2))
+    node, _ = EMPTY_NODE.assoc(shift, h1, key1, value1)
+    node, _ = node.assoc(shift, h2, key2, value2)
+    return node
+
+class BitmapNode:
+    __slots__ = ('bitmap', 'array')
+    def __init__(self, bitmap, array):
+        self.bitmap = bitmap
+        self.array = array
+
+    def get(self, shift, h, key, default):
+        bit = bit_of(h, shift)
+        if not self.bitmap & bit:
+            return default
+        i = index_of(self.bitmap, bit)
+        k = self.array[i]
+        if k is NODE:
+            return self.array[i + 1].get(shift + BITS, h, key, default)
+        if k == key:
+            return self.array[i + 1]
+        return default
+
+    def assoc(self, shift, h, key, value):
+        """
+        Returns:
+          node, added = the node with the key bound to the value and whether
+                        the key is new.
+        """
+        bit = bit_of(h, shift)
+        i = index_of(self.bitmap, bit)
+        array = self.array
+        if not self.bitmap & bit:
+            return BitmapNode(self.bitmap | bit, array[:i] + (key, value) + array[i:]), True
+        k, v = array[i], array[i + 1]
+        if k is NODE:
+            node, added = v.assoc(shift + BITS, h, key, value)
+            if node is v:
+                return self, False
+            return BitmapNode(self.bitmap, array[:i + 1] + (node,) + array[i + 2:]), added
+        if k == key:
+            if v is value:
+                return self, False
+            return BitmapNode(self.bitmap, array[:i + 1] + (value,) + array[i + 2:]), False
+        node = make_node(shift + BITS, hash_of(k), k, v, h, key, value)
+        return BitmapNode(self.bitmap, array[:i] + (NODE, node) + array[i + 2:]), True
+
+    def dissoc(self, shift, h, key):
+        """
+        Returns:
+          the node without the key, None if that leaves it empty.
+        """
+        bit = bit_of(h, shift)
+        if not self.bitmap & bit:
+            return self
+        i = index_of(self.bitmap, bit)
+        array = self.array
+        k, v = array[i], array[i + 1]
+        if k is NODE:
+            node = v.dissoc(shift + BITS, h, key)
+            if node is v:
+                return self
+            if node is not None:
+                if type(node) is BitmapNode and len(node.array) == 2 and node.array[0] is not NODE:
+                    # a lone entry moves up
+                    return BitmapNode(self.bitmap, array[:i] + node.array + array[i + 2:])
+                return BitmapNode(self.bitmap, array[:i + 1] + (node,) + array[i + 2:])
+        elif k != key:
+            return self
+        if self.bitmap == bit:
+            return None
+        return BitmapNode(self.bitmap ^ bit, array[:i] + array[i + 2:])
+
+    def items(self):
+        array = self.array
+        for i in range(0, len(array), 2):
+            if array[i] is NODE:
+                yield from array[i + 1].items()
+            else:
+                yield array[i], array[i + 1]
+
+class CollisionNode:
+    __slots__ = ('hash', 'array')
+    def __init__(self, h, array):
+        self.hash = h
+        self.array = array
+
+    def find(self, key):
+        for i in range(0, len(self.array), 2):
+            if self.array[i] == key:
+                return i
+        return -1
+
+    def get(self, shift, h, key, default):
+        i = self.find(key) if h == self.hash else -1
+        return default if i < 0 else self.array[i + 1]
+
+    def assoc(self, shift, h, key, value):
+        if h != self.hash:
+            node = BitmapNode(bit_of(self.hash, shift), (NODE, self))
+            return node.assoc(shift, h, key, value)
+        i = self.find(key)
+        if i < 0:
+            return CollisionNode(h, self.array + (key, value)), True
+        if self.array[i + 1] is value:
+            return self, False
+        return CollisionNode(h, self.array[:i + 1] + (value,) + self.array[i + 2:]), False
+
+    def dissoc(self, shift, h, key):
+        i = self.find(key) if h == self.hash else -1
+        if i < 0:
+            return self
+        array = self.array[:i] + self.array[i + 2:]
+        if len(array) == 2:
+            return BitmapNode(bit_of(self.hash, shift), array)
+        return CollisionNode(self.hash, array)
+
+    def items(self):
+        for i in range(0, len(self.array), 2):
+            yield self.array[i], self.array[i + 1]
+
+EMPTY_NODE = BitmapNode(0, ())
+
+class HAMT:
+    """
+    A persistent map. Updates give a new map and leave this one as it was.
+    """
+    __slots__ = ('root', 'count')
+    def __init__(self, items=(), root=EMPTY_NODE, count=0):
+        for key, value in getattr(items, 'items', lambda: items)():
+            root, added = root.assoc(0, hash_of(key), key, value)
+            count += added
+        self.root = root
+        self.count = count
+
+    def get(self, key, default=None):
+        return self.root.get(0, hash_of(key), key, default)
+
+    def assoc(self, key, value):
+        """
+        Gets the map with the key bound to the value.
+        """
+        root, added = self.root.assoc(0, hash_of(key), key, value)
+        if root is self.root:
+            return self
+        return HAMT(root=root, count=self.count + added)
+
+    def dissoc(self, key):
+        """
+        Gets the map without the key.
+        """
+        root = self.root.dissoc(0, hash_of(key), key)
+        if root is self.root:
+            return self
+        return HAMT(root=EMPTY_NODE if root is None else root, count=self.count - 1)
+
+    def items(self):
+        return self.root.items()
+
+    def keys(self):
+        return (key for key, _ in self.items())
+
+    def __getitem__(self, key):
+        rv = self.get(key, NODE)
+        if rv is NODE:
+            raise KeyError(key)
+        return rv
+
+    def __contains__(self, key):
+        return self.get(key, NODE) is not NODE
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.keys()
+
+    def __eq__(self, other):
+        if not isinstance(other, HAMT) or len(self) != len(other):
+            return False
+        return all(other.get(key, NODE) == value for key, value in self.items())
+
+    def __reduce__(self):
+        # the nodes aren't pickled: NODE is only itself in this process
+        return (HAMT, (list(self.items()),))
+
+    def __repr__(self):
+        return 'HAMT({{{}}})'.format(', '.join('{!r}: {!r}'.format(k, v) for k, v in self.items()))
@@ -0,0 +1,71 @@
+"""
+Builtins over hashmaps (see `sem_lang_types.HashMap`). The maps are persistent:
+`assoc` and `dissoc` give a new map, sharing most of its structure with the old.
+
+`hashmap_literals` gets them as variables to put in a context, like:
+
+    (lookup (assoc (hashmap) "pi" 3.14) "pi")
+
+The maps made by `hashmap` are of any keys to any values, but validate as
+maps of other types when their entries do (see `TypeTag.by_entries`), so
+they can be annotated as such:
+
+    (assoc (hashmap) "pi" 3.14)?F:(hashmap ?F:string ?F:float)
+
+The other builtins take maps of any types (so they're declared over `any`, as
+tags of different types are different tags): `assoc` and `dissoc` give a map
+of the type they're given, and `assoc` checks the entry is of that type.
+"""
+from sem_lang_types import ANY, Bool, Float, HashMap, TypeTag, wrap_py_fn
+
+HASHMAP = TypeTag('hashmap', [ANY, ANY])
+
+def empty():
+    return HashMap(ANY, ANY)
+
+def ensure_key(key):
+    try:
+        hash(key)
+    except TypeError:
+        raise ValueError("{} cannot be a key".format(key))
+    return key
+
+def ensure_hashmap(entries):
+    if type(entries) is not HashMap:
+        raise ValueError("{} is not a hashmap".format(entries))
+    return entries
+
+def assoc(entries, key, value):
+    key_tag, value_tag = ensure_hashmap(entries).tag.args
+    if not (key_tag.validate(key) and value_tag.validate(value)):
+        raise ValueError("{} -> {} cannot go in a {}".format(key, value, entries.tag))
+    return entries.updated(entries.binding.assoc(ensure_key(key), value))
+
+def dissoc(entries, key):
+    return ensure_hashmap(entries).updated(entries.binding.dissoc(ensure_key(key)))
+
+def lookup(entries, key):
+    rv = ensure_hashmap(entries).binding.get(ensure_key(key))
+    if rv is None:
+        raise ValueError("{} is not in the map".format(key))
+    return rv
+
+def contains(entries, key):
+    return ensure_key(key) in ensure_hashmap(entries).binding
+
+def count(entries):
+    return len(ensure_hashmap(entries))
+
+def hashmap_literals():
+    """
+    The hashmap builtins by their names (to add to the variables of a context).
+    """
+    fns = [
+        (empty, 'hashmap', HASHMAP),
+        (assoc, 'assoc', ANY, ANY, ANY, ANY),
+        (dissoc, 'dissoc', ANY, ANY, ANY),
+        (lookup, 'lookup', ANY, ANY, ANY),
+        (contains, 'contains', ANY, ANY, Bool.tag),
+        (count, 'count', ANY, Float.tag),
+    ]
+    return {fn[1]: wrap_py_fn(*fn) for fn in fns}
@@ -0,0 +1,223 @@
+"""
+Incremental evaluation of a source that is edited again and again (in a REPL
+or an editor), keeping what didn't change from one version to the next.
+
+The source is split into its top-level expressions (see `tokenizer.next_form`),
+again only around the text that changed, and only the expressions whose text
+changed are parsed again. The expressions
+evaluated again are those that changed and those that use (through the
+functions they call) a name that a changed expression binds, in the order
+they are in the source. The rest keep their values.
+
+Uses are found in the resolved trees, as the names looked up in the global
+scope (see `BaseContext.resolve`), so this is for top-level contexts.
+"""
+import bisect
+from collections import namedtuple
+
+import tokenizer as tok
+from syntax_tree import Form, Scope, Var
+
+FormResult = namedtuple('FormResult', ['index', 'span', 'value', 'error'])
+FormResult.__doc__ = """
+The evaluation of the index-th top-level expression: its (start, end) offsets
+in the source and its value, or the error it raised (as a string).
+"""
+
+def common_prefix(a, b):
+    """
+    Gets the length of the longest common prefix of the strings.
+    """
+    # bisected, comparing only what isn't known to be the same yet
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def common_suffix(a, b, limit):
+    """
+    Gets the length of the longest common suffix of the strings, up to limit.
+    """
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+class TopLevelForm:
+    """
+    A top-level expression of the source: its text, its parsed tree and what
+    it binds and uses in the global scope.
+    """
+    __slots__ = ('text', 'node', 'defines', 'uses', 'error', 'value')
+    def __init__(self, text, node=None, defines=(), uses=(), error=None):
+        self.text = text
+        self.node = node
+        self.defines = frozenset(defines)
+        self.uses = frozenset(uses)
+        self.error = error
+        self.value = None
+
+def global_uses(node, names):
+    """
+    Adds the names of the variables in the resolved tree that are looked up
+    in the global scope to the set.
+    """
+    if isinstance(node, Var):
+        if isinstance(node.slot, str):
+            names.add(node.name)
+    elif isinstance(node, Scope):
+        global_uses(node.body, names)
+    elif isinstance(node, Form):
+        for child in node.children:
+            global_uses(child, names)
+
+class Session:
+    """
+    A source evaluated in a context, kept up to date as it is edited (see
+    `update`).
+
+    After each update, parsed and evaluated are the number of expressions
+    that were parsed and evaluated again.
+    """
+    def __init__(self, context, check=False):
+        """
+        Args:
+          context = the top-level context to evaluate in.
+          check (default False) = whether to type check (see `BaseContext.check`)
+                  rather than only resolve the expressions.
+        """
+        self.context = context
+        self.check = check
+        self.source = ''
+        self.forms = []
+        self.spans = []
+        # the globals from before the session, to put back when they stop being bound
+        self.base = dict(context.lexical_vars.frame)
+        self.parsed = 0
+        self.evaluated = 0
+
+    def parse(self, text):
+        ctx = self.context
+        try:
+            nodes = tok.parse_program(list(tok.tokenize(text)), ctx)
+            if len(nodes) != 1:
+                raise ValueError("Expected one expression in {}".format(text))
+            node = nodes[0]
+            defines = []
+            ctx.collect_names(node, defines)
+            uses = set()
+            global_uses(ctx.resolve(node), uses)
+        except Exception as e:
+            return TopLevelForm(text, error='{}: {}'.format(type(e).__name__, e))
+        return TopLevelForm(text, node, defines, uses)
+
+    def unbind(self, names):
+        frame = self.context.lexical_vars.frame
+        for name in names:
+            if name in self.base:
+                frame[name] = self.base[name]
+            else:
+                frame.pop(name, None)
+
+    def evaluate(self, form):
+        ctx = self.context
+        try:
+            node = ctx.check(form.node) if self.check else ctx.resolve(form.node)
+            form.value = ctx.eval(node)
+            form.error = None
+        except Exception as e:
+            # whatever it raises, or an update would stop halfway with the forms changed
+            form.value = None
+            form.error = '{}: {}'.format(type(e).__name__, e)
+
+    def update(self, source):
+        """
+        Brings the evaluation up to date with the new version of the source.
+
+        Returns:
+          list of `FormResult` of the expressions evaluated again (see `results`
+          for them all).
+        """
+        old_source, old_spans, old_forms = self.source, self.spans, self.forms
+        prefix = common_prefix(old_source, source)
+        suffix = common_suffix(old_source, source, min(len(old_source), len(source)) - prefix)
+        delta = len(source) - len(old_source)
+        # the expressions ending before the change are the same, but for the
+        # last of them, that could get an annotation
+        first = max(0, bisect.bisect_left([end for _, end in old_spans], prefix) - 1)
+        old_starts = [start for start, _ in old_spans]
+        middle = []
+        resync = len(old_spans)
+        span = tok.next_form(source, old_spans[first - 1][1] if first else 0)
+        while span is not None:
+            if span[0] >= len(source) - suffix:
+                # from an old start after the change, the rest splits as it did
+                j = bisect.bisect_left(old_starts, span[0] - delta, first)
+                if j < len(old_starts) and old_starts[j] == span[0] - delta:
+                    resync = j
+                    break
+            middle.append(span)
+            span = tok.next_form(source, span[1])
+        self.spans = old_spans[:first] + middle + [(start + delta, end + delta) for start, end in old_spans[resync:]]
+        self.source = source
+
+        # the expressions in the middle are parsed again unless only moved
+        reusable = dict()
+        for form in old_forms[first:resync]:
+            reusable.setdefault(form.text, []).append(form)
+        changed = set()
+        dirty = set()
+        self.parsed = 0
+        forms = []
+        for index, (start, end) in enumerate(middle, first):
+            text = source[start:end]
+            if reusable.get(text):
+                forms.append(reusable[text].pop(0))
+                continue
+            forms.append(self.parse(text))
+            self.parsed += 1
+            dirty.add(index)
+            changed.update(forms[-1].defines)
+        for removed in reusable.values():
+            for form in removed:
+                changed.update(form.defines)
+        self.forms = forms = old_forms[:first] + forms + old_forms[resync:]
+
+        # the uses of a function are those of the functions it calls too, and a
+        # name bound again must be bound by whatever else binds it
+        spreading = bool(changed)
+        while spreading:
+            spreading = False
+            for index, form in enumerate(forms):
+                if index not in dirty and (form.uses | form.defines) & changed:
+                    dirty.add(index)
+                    if form.defines - changed:
+                        spreading = True
+                        changed.update(form.defines)
+        self.unbind(changed)
+        self.evaluated = 0
+        rv = []
+        for index in sorted(dirty):
+            if forms[index].node is not None:
+                self.evaluate(forms[index])
+                self.evaluated += 1
+            rv.append(self.result(index))
+        return rv
+
+    def result(self, index):
+        form = self.forms[index]
+        return FormResult(index, self.spans[index], form.value, form.error)
+
+    def results(self):
+        """
+        Gets the `FormResult` of every top-level expression in the source.
+        """
+        return [self.result(index) for index in range(len(self.forms))]
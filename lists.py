@@ -0,0 +1,157 @@
+"""
+Builtins over lists of floats (see `sem_lang_types.List`) that work on the
+array of a list whole: with numpy, arithmetic and folds are numpy calls and
+without it they are `map`s of the operators over the `array('d')`s, so neither
+goes through the interpreter for each element.
+
+`list_literals` gets them as variables to put in a context, like:
+
+    (sum (.* (range 4) (fill 4 2.5)))
+
+`map` and `fold` take functions of any types (so they're declared over `any`,
+as tags of different types are different tags), as long as they take and give
+floats when called.
+"""
+import operator
+from array import array
+from functools import partial
+
+from sem_lang_types import ANY, Float, List, TypeTag, float_array, numpy, tag_of, wrap_py_fn
+
+FLOAT_LIST = TypeTag('list', [Float.tag])
+FLOAT_FN = TypeTag('->', [Float.tag, Float.tag])
+FOLD_FN = TypeTag('->', [Float.tag, Float.tag, Float.tag])
+
+def floats(values):
+    """
+    Gets a list of floats with the values (an iterable or an array).
+    """
+    return List(Float.tag, values)
+
+def elementwise(op, numpy_op, xs, ys):
+    """
+    Applies the operator to the elements of the two lists, pair by pair.
+    """
+    if len(xs) != len(ys):
+        raise ValueError("Lists of lengths {} and {} cannot be combined".format(len(xs), len(ys)))
+    if numpy is not None:
+        return floats(numpy_op(xs.binding, ys.binding))
+    return floats(array('d', map(op, xs.binding, ys.binding)))
+
+def scalar(op, numpy_op, xs, y):
+    """
+    Applies the operator to each element of the list and the float.
+    """
+    if numpy is not None:
+        return floats(numpy_op(xs.binding, y))
+    return floats(array('d', [op(x, y) for x in xs.binding]))
+
+def make_range(n):
+    if numpy is not None:
+        return floats(numpy.arange(int(n), dtype=numpy.float64))
+    return floats(array('d', range(int(n))))
+
+def fill(n, value):
+    if numpy is not None:
+        return floats(numpy.full(int(n), value, dtype=numpy.float64))
+    return floats(array('d', [value]) * int(n))
+
+def at(xs, i):
+    if not 0 <= i < len(xs) or i != int(i):
+        raise ValueError("{} is not an index of a list of {}".format(i, len(xs)))
+    return xs.binding[int(i)]
+
+def append(xs, value):
+    if numpy is not None:
+        return floats(numpy.append(xs.binding, value))
+    rv = array('d', xs.binding)
+    rv.append(value)
+    return floats(rv)
+
+def dot(xs, ys):
+    if len(xs) != len(ys):
+        raise ValueError("Lists of lengths {} and {} cannot be combined".format(len(xs), len(ys)))
+    if numpy is not None:
+        return numpy.dot(xs.binding, ys.binding)
+    return sum(map(operator.mul, xs.binding, ys.binding))
+
+def total(xs):
+    if numpy is not None:
+        return numpy.sum(xs.binding)
+    return sum(xs.binding)
+
+def elements(xs):
+    """
+    Gets the elements of the list as python floats (numpy's float64s are
+    floats to the interpreter too, but only by `sem_lang_types.tag_of`'s
+    slower path).
+    """
+    if numpy is not None:
+        return xs.binding.tolist()
+    return xs.binding
+
+def float_fn(fn, tag):
+    """
+    Gets a python function calling the function on floats: its binding itself
+    for a function of the tag (over floats), or a call that validates the
+    arguments and that the function gave a float otherwise.
+
+    Raises:
+      ValueError = for a value that isn't a function of as many arguments.
+    """
+    arity = len(tag.args) - 1
+    if tag_of(fn).kind != '->' or len(fn.gen) != arity + 1:
+        raise ValueError("{} is not a function of {} arguments".format(fn, arity))
+    binding = fn.get()
+    if fn.tag is tag:
+        # the elements are known to be floats
+        if fn.checked_return:
+            return binding
+        return lambda *args: fn.check_return(binding(*args))
+    def call(*args):
+        fn.check_args(args)
+        rv = fn.check_return(binding(*args))
+        if not Float.tag.validate(rv):
+            raise ValueError("Type error in the return of {}: {} is not a float".format(fn.name, rv))
+        return rv
+    return call
+
+def map_fn(fn, xs):
+    """
+    Maps a function over floats over the list.
+    """
+    return floats(array('d', map(float_fn(fn, FLOAT_FN), elements(xs))))
+
+def fold(fn, initial, xs):
+    """
+    Folds the list from the left with a function over floats.
+    """
+    call = float_fn(fn, FOLD_FN)
+    rv = initial
+    for x in elements(xs):
+        rv = call(rv, x)
+    return rv
+
+def list_literals():
+    """
+    The list builtins by their names (to add to the variables of a context).
+    """
+    fl, fls = Float.tag, FLOAT_LIST
+    fns = [
+        (make_range, 'range', fl, fls),
+        (fill, 'fill', fl, fl, fls),
+        (len, 'length', fls, fl),
+        (at, 'at', fls, fl, fl),
+        (append, 'append', fls, fl, fls),
+        (partial(elementwise, operator.add, numpy and numpy.add), '.+', fls, fls, fls),
+        (partial(elementwise, operator.sub, numpy and numpy.subtract), '.-', fls, fls, fls),
+        (partial(elementwise, operator.mul, numpy and numpy.multiply), '.*', fls, fls, fls),
+        (partial(elementwise, operator.truediv, numpy and numpy.true_divide), './', fls, fls, fls),
+        (partial(scalar, operator.add, numpy and numpy.add), 'offset', fls, fl, fls),
+        (partial(scalar, operator.mul, numpy and numpy.multiply), 'scale', fls, fl, fls),
+        (total, 'sum', fls, fl),
+        (dot, 'dot', fls, fls, fl),
+        (map_fn, 'map', ANY, fls, fls),
+        (fold, 'fold', ANY, fl, fls, fl),
+    ]
+    return {fn[1]: wrap_py_fn(*fn) for fn in fns}
@@ -0,0 +1,129 @@
+"""
+Loads whole source files, parsing them on a pool of processes: each file is
+split into its top-level expressions by balancing parens (see
+`tokenizer.split_forms`), the expressions are tokenized and parsed in chunks
+across the workers and the trees are then evaluated in order.
+
+Several files can be loaded at once, as independent modules: their chunks are
+parsed together (so small files share the workers) and then each is evaluated
+in a context of its own, so one can't see or rebind what another defines.
+
+The contexts (those the workers parse in too) are made by the context factory,
+so it must be picklable (a function defined at the top level of a module, say).
+"""
+import gc
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import tokenizer as tok
+
+Loaded = namedtuple('Loaded', ['path', 'context', 'nodes', 'value'])
+Loaded.__doc__ = """
+A file loaded: the context it was evaluated in, the trees of its expressions
+(as evaluated) and the value of the last of them (None for no expressions).
+"""
+
+Timings = namedtuple('Timings', ['read', 'scan', 'parse', 'evaluate'])
+Timings.__doc__ = """
+The seconds each stage of loading took, over all the files: reading them,
+splitting them into expressions, parsing those and evaluating them.
+"""
+
+# the context the expressions are parsed in, in a worker
+worker_context = None
+
+def init_worker(context_factory):
+    global worker_context
+    worker_context = context_factory()
+    # trees have no cycles, and the collector would walk every tree made so far
+    gc.disable()
+
+def parse_chunk(text):
+    return tok.parse_program(list(tok.tokenize(text)), worker_context)
+
+def chunk_source(source, size):
+    """
+    Splits the source into chunks of about size characters, between its
+    top-level expressions.
+    """
+    chunks = []
+    start = 0
+    for _, end in tok.split_forms(source):
+        if end - start >= size:
+            chunks.append(source[start:end])
+            start = end
+    if source[start:].strip():
+        chunks.append(source[start:])
+    return chunks
+
+def load_files(paths, context_factory, workers=None, check=False, chunk_size=1 << 16, contexts=None):
+    """
+    Loads the files (see the module), each in a context of its own.
+
+    Args:
+      paths = the source files, evaluated in this order.
+      context_factory = a picklable function making (top-level) contexts.
+      workers (default: one per CPU) = the number of processes parsing, or 0
+                (or 1) to parse in this process.
+      check (default False) = whether to type check (see `BaseContext.check`)
+                rather than only resolve the expressions.
+      chunk_size (default 64K) = about how many characters a worker parses at once.
+      contexts (default: new ones) = the context to evaluate each file in.
+    Raises:
+      ValueError = for code that doesn't parse (or check, or evaluate).
+    Returns:
+      list of `Loaded` for the files, `Timings`
+    """
+    start = time.perf_counter()
+    sources = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            sources.append(f.read())
+    read = time.perf_counter()
+    chunks = [chunk_source(source, chunk_size) for source in sources]
+    scanned = time.perf_counter()
+    texts = [text for file_chunks in chunks for text in file_chunks]
+    # (unpickled) trees have no cycles, and collecting takes longer than parsing
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(texts))
+        if workers <= 1:
+            ctx = context_factory()
+            parsed = [tok.parse_program(list(tok.tokenize(text)), ctx) for text in texts]
+        else:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(context_factory,)) as pool:
+                parsed = list(pool.map(parse_chunk, texts))
+    finally:
+        if collecting:
+            gc.enable()
+    done_parsing = time.perf_counter()
+    loaded = []
+    parsed = iter(parsed)
+    if contexts is None:
+        contexts = [context_factory() for _ in paths]
+    for path, context, file_chunks in zip(paths, contexts, chunks):
+        nodes = []
+        value = None
+        for _ in file_chunks:
+            for node in next(parsed):
+                node = context.check(node) if check else context.resolve(node)
+                value = context.eval(node)
+                nodes.append(node)
+        loaded.append(Loaded(path, context, nodes, value))
+    return loaded, Timings(read - start, scanned - read, done_parsing - scanned, time.perf_counter() - done_parsing)
+
+def load_file(path, context_factory, workers=None, check=False, chunk_size=1 << 16, context=None):
+    """
+    Loads a single file (see `load_files`), in the context if given.
+
+    Returns:
+      `Loaded`, `Timings`
+    """
+    contexts = None if context is None else [context]
+    loaded, timings = load_files([path], context_factory, workers, check, chunk_size, contexts)
+    return loaded[0], timings
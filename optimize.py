@@ -0,0 +1,257 @@
+"""
+An optimization pass over resolved (or checked) programs, run before they
+are evaluated:
+
+  * calls to pure builtins (see `sem_lang_types.Function.pure`) with constant
+    arguments are folded into their values,
+  * `if!`s with constant conditions become the branch taken, and
+  * calls to small `def!`s of the program that only use their arguments and
+    globals are inlined, when the arguments are constants or variables.
+
+The builtins folded are those bound in the context when the program is
+optimized and the functions inlined those defined in the program, so the
+names they are bound to mustn't be bound again while it runs. Only values that
+aren't boxed (floats, strings and bools) are folded in.
+"""
+from sem_lang_types import Function, SpecialForm, UNBOXED_TAGS
+from syntax_tree import Atom, Form, Const, Var, Scope
+
+class Report:
+    """
+    What was optimized:
+
+      folded = (the name of the builtin, the value) for each call folded.
+      pruned = the number of `if!`s with constant conditions.
+      inlined = the name of the function inlined for each call inlined.
+    """
+    def __init__(self):
+        self.folded = []
+        self.pruned = 0
+        self.inlined = []
+
+    def __str__(self):
+        return '{} calls folded, {} branches pruned, {} calls inlined'.format(
+                len(self.folded), self.pruned, len(self.inlined))
+
+def global_name(node):
+    if isinstance(node, Var) and isinstance(node.slot, str):
+        return node.name
+    return None
+
+def size(node):
+    if isinstance(node, Form):
+        return 1 + sum(size(child) for child in node.children)
+    if isinstance(node, Scope):
+        return 1 + size(node.body)
+    return 1
+
+class Optimizer:
+    """
+    Optimizes the trees of a program, in order (see `optimize_program`).
+    """
+    def __init__(self, context, max_inline_size=16):
+        self.context = context
+        self.max_inline_size = max_inline_size
+        self.report = Report()
+        self.globals = context.lexical_vars
+        while self.globals.parent is not None:
+            self.globals = self.globals.parent
+        forms = context.special_forms
+        self.if_form = forms['if!']
+        self.def_forms = (forms['def!'], forms['defmemo!'])
+        # the names bound in the program, with the number of times they're bound
+        self.defined = dict()
+        # name -> (the annotation of the name, the arguments, the body) of def!s to inline
+        self.inlinable = dict()
+
+    def program(self, nodes):
+        for node in nodes:
+            self.collect_defined(node)
+        rv = []
+        for node in nodes:
+            node = self.expr(node, 0, True)
+            # only def!s of the program itself are sure to have run when
+            # the expressions after them do (not those in an if!, say)
+            self.add_inlinable(node)
+            rv.append(node)
+        return rv
+
+    def collect_defined(self, node):
+        """
+        Counts the names bound in the global scope by the tree.
+        """
+        if not isinstance(node, Form) or not node.children:
+            return
+        head = node.children[0]
+        if isinstance(head, Const) and head.value in self.def_forms and node.args \
+                and isinstance(node.args[0], Atom):
+            name = node.args[0].token
+            self.defined[name] = self.defined.get(name, 0) + 1
+        for child in node.children:
+            self.collect_defined(child)
+
+    def expr(self, node, depth, inlining):
+        """
+        Optimizes the tree, which is depth scopes in.
+        """
+        if isinstance(node, Scope):
+            return node._replace(body=self.expr(node.body, depth + 1, inlining))
+        if not isinstance(node, Form) or not node.children:
+            return node
+        node = node._replace(children=tuple(self.expr(child, depth, inlining) for child in node.children))
+        head = node.children[0]
+        if isinstance(head, Const) and isinstance(head.value, SpecialForm):
+            if head.value is self.if_form:
+                return self.if_special_form(node)
+            return node
+        name = global_name(head)
+        if name is None:
+            return node
+        if inlining and name in self.inlinable:
+            return self.inline(node, name, depth)
+        if name in self.defined:
+            return node
+        return self.fold(node, name)
+
+    def valid(self, value, annotation):
+        return annotation is None or self.context.validate_type(value, *annotation)
+
+    def fold(self, node, name):
+        fn = self.globals.get(name)
+        if type(fn) is not Function or not fn.pure:
+            return node
+        args = node.args
+        if not all(isinstance(arg, Const) and type(arg.value) in UNBOXED_TAGS
+                and self.valid(arg.value, arg.annotation) for arg in args):
+            return node
+        try:
+            value = fn(*(arg.value for arg in args))
+        except (ValueError, ArithmeticError):
+            # left to fail when evaluated
+            return node
+        if type(value) not in UNBOXED_TAGS:
+            return node
+        self.report.folded.append((name, value))
+        return Const(value, node.annotation)
+
+    def if_special_form(self, node):
+        if len(node.args) != 3:
+            return node
+        cond, then, otherwise = node.args
+        if not isinstance(cond, Const) or not self.valid(cond.value, cond.annotation):
+            return node
+        branch = then if cond.value else otherwise
+        if node.annotation is not None:
+            if branch.annotation not in (None, node.annotation):
+                return node
+            branch = branch._replace(annotation=node.annotation)
+        self.report.pruned += 1
+        return branch
+
+    def add_inlinable(self, node):
+        if not isinstance(node, Form) or not node.children or len(node.args) != 3:
+            return
+        head = node.children[0]
+        if not isinstance(head, Const) or head.value is not self.def_forms[0]:
+            return
+        name, params, body = node.args
+        if not isinstance(name, Atom) or self.defined.get(name.token) != 1 \
+                or not isinstance(params, Form) or not isinstance(body, Scope):
+            return
+        names = tuple(param.token for param in params.children if isinstance(param, Atom))
+        # no variables but the arguments (so no def!s within)
+        if len(names) != len(params.children) or body.names != names:
+            return
+        if size(body.body) <= self.max_inline_size and self.is_closed(body.body, name.token):
+            self.inlinable[name.token] = (name.annotation, params.children, body.body)
+
+    def is_closed(self, node, name):
+        """
+        Whether the body only uses its arguments and globals other than the
+        function's name.
+        """
+        if isinstance(node, Var):
+            if isinstance(node.slot, str):
+                return node.name != name
+            return node.depth == 0
+        if isinstance(node, Form):
+            return all(self.is_closed(child, name) for child in node.children)
+        return isinstance(node, Const)
+
+    def inline(self, node, name, depth):
+        returns, params, body = self.inlinable[name]
+        args = node.args
+        if len(args) != len(params) or not all(isinstance(arg, (Const, Var)) for arg in args):
+            return node
+        annotations = [a for a in (node.annotation, returns, body.annotation) if a is not None]
+        if any(a != annotations[0] for a in annotations):
+            return node
+        values = []
+        for param, arg in zip(params, args):
+            if param.annotation is not None:
+                if isinstance(arg, Const):
+                    if not self.valid(arg.value, param.annotation):
+                        return node
+                elif arg.annotation in (None, param.annotation) and self.uses(body, len(values)):
+                    arg = arg._replace(annotation=param.annotation)
+                else:
+                    return node
+            values.append(arg)
+        try:
+            inlined = self.substitute(body, values, depth)
+        except ValueError:
+            return node
+        if annotations:
+            inlined = inlined._replace(annotation=annotations[0])
+        self.report.inlined.append(name)
+        # the calls in the body aren't inlined in turn
+        return self.expr(inlined, depth, False)
+
+    def uses(self, node, slot):
+        if isinstance(node, Var):
+            return node.slot == slot
+        if isinstance(node, Form):
+            return any(self.uses(child, slot) for child in node.children)
+        return False
+
+    def substitute(self, node, values, depth):
+        """
+        Puts the values in place of the arguments in the body, to be depth scopes in.
+
+        Raises:
+          ValueError = for an argument with another annotation than its use, or
+                       a constant that isn't valid for it.
+        """
+        if isinstance(node, Var):
+            if isinstance(node.slot, str):
+                return node._replace(depth=depth)
+            value = values[node.slot]
+            if node.annotation is None or value.annotation == node.annotation:
+                return value
+            if isinstance(value, Const) and value.annotation is None:
+                if not self.valid(value.value, node.annotation):
+                    raise ValueError("{} is not a {}".format(value.value, node.annotation[1]))
+                return value
+            if value.annotation is not None:
+                raise ValueError("{} is annotated twice".format(node.name))
+            return value._replace(annotation=node.annotation)
+        if isinstance(node, Form):
+            return node._replace(children=tuple(self.substitute(child, values, depth) for child in node.children))
+        return node
+
+def optimize_program(nodes, context, enabled=True, max_inline_size=16):
+    """
+    Optimizes the resolved (or checked) trees of a program, which are to be
+    evaluated in order in the (top-level) context.
+
+    Args:
+      enabled (default True) = whether to optimize, rather than leave the trees be.
+      max_inline_size (default 16) = the most nodes in the body of a function
+                that is inlined.
+    Returns:
+      the optimized trees, `Report` of what was optimized.
+    """
+    if not enabled:
+        return list(nodes), Report()
+    optimizer = Optimizer(context, max_inline_size)
+    return optimizer.program(list(nodes)), optimizer.report
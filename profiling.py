@@ -0,0 +1,181 @@
+"""
+Instrumentation of evaluation: a context that counts and times the calls made
+in it (by the name of the function called), the type checks and the special
+forms evaluated, and that can be sampled for a profile of where the program
+spends its time, as collapsed stacks (the input of flamegraph.pl and the like).
+
+It costs nothing when not used: only `ProfilingContext`s are instrumented, so
+to profile a program, evaluate it in one rather than in a `BaseContext`. The
+calls are those the evaluator makes through the context, so the bytecode VM
+(which makes calls itself) isn't seen.
+
+A call that gives a `Tail` ends when the evaluator has the value of the tail
+(the check of the tail ends it, see `CallEnd`), so tail calls still take no
+stack when profiled, though the profile's stack of names grows with them.
+"""
+import threading
+import time
+from collections import Counter
+
+from context import BaseContext
+from sem_lang_types import Function, Tail
+
+class Profile:
+    """
+    What was gathered in a `ProfilingContext`:
+
+      calls = the number of calls to each function (by name).
+      time = the seconds spent in each function (by name), including the functions
+             it called (recursive calls aren't counted twice).
+      type_checks = the number of validations of each type (a tag) made.
+      special_forms = the number of evaluations of each special form (by name).
+      samples = the number of samples of each stack of function names (see `sampling`).
+    """
+    def __init__(self):
+        self.calls = Counter()
+        self.time = Counter()
+        self.type_checks = Counter()
+        self.special_forms = Counter()
+        self.samples = Counter()
+        # the names of the functions being called (and when), outermost first
+        self.stack = []
+        self.starts = []
+        self.active = Counter()
+
+    def enter(self, name):
+        self.calls[name] += 1
+        self.stack.append(name)
+        self.starts.append(time.perf_counter())
+        self.active[name] += 1
+
+    def exit(self):
+        """
+        Ends the innermost call.
+        """
+        name = self.stack.pop()
+        start = self.starts.pop()
+        self.active[name] -= 1
+        if not self.active[name]:
+            self.time[name] += time.perf_counter() - start
+
+    def unwind(self, depth):
+        """
+        Ends the calls past the depth (the calls a failed evaluation left).
+        """
+        while len(self.stack) > depth:
+            self.exit()
+
+    def sample(self):
+        if self.stack:
+            self.samples[tuple(self.stack)] += 1
+
+    def sampling(self, interval=0.001):
+        """
+        Gets a context manager that samples the stack every interval seconds
+        (or as often as python switches threads, if that is less often) while
+        it is entered.
+        """
+        return Sampler(self, interval)
+
+    def collapsed(self):
+        """
+        Gets the samples as collapsed stacks: a line per stack, like `fib;fib;+ 12`.
+        """
+        return '\n'.join('{} {}'.format(';'.join(stack), count) for stack, count in sorted(self.samples.items()))
+
+    def report(self, limit=20):
+        """
+        Gets a table of the functions taking the most time.
+        """
+        lines = ['{:>10} {:>12}  {}'.format('calls', 'seconds', 'function')]
+        for name, seconds in self.time.most_common(limit):
+            lines.append('{:>10} {:>12.6f}  {}'.format(self.calls[name], seconds, name))
+        return '\n'.join(lines)
+
+class Sampler:
+    """
+    Samples the stack of a `Profile` from a thread of its own (see `Profile.sampling`).
+    """
+    def __init__(self, profile, interval):
+        self.profile = profile
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.profile.sample()
+
+    def __enter__(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self.profile
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+class CallEnd:
+    """
+    The check of the `Tail` of a profiled call: the call ends when the
+    evaluator validates the value of the tail, which is then validated by the
+    check the tail had (if any).
+    """
+    __slots__ = ('profile', 'check')
+    def __init__(self, profile, check):
+        self.profile = profile
+        self.check = check
+    def validate(self, value):
+        self.profile.exit()
+        return self.check is None or self.check.validate(value)
+    def __repr__(self):
+        return repr(self.check)
+
+class ProfilingContext(BaseContext):
+    """
+    A `BaseContext` that gathers a `Profile` of what is evaluated in it.
+    """
+    def __init__(self, evaluator, type_evaluator, lexical_vars, profile=None, **kwargs):
+        super().__init__(evaluator, type_evaluator, lexical_vars, **kwargs)
+        self.profile = Profile() if profile is None else profile
+
+    def call(self, fn, *args):
+        if type(fn) != Function:
+            raise ValueError("Non-function {} passed in".format(fn))
+        for typ in fn.gen[:-1]:
+            self.profile.type_checks[typ] += 1
+        return self.profiled_call(BaseContext.call, fn, args)
+
+    def call_checked(self, fn, *args):
+        return self.profiled_call(BaseContext.call_checked, fn, args)
+
+    def profiled_call(self, call, fn, args):
+        profile = self.profile
+        depth = len(profile.stack)
+        profile.enter(fn.name or '<anonymous>')
+        try:
+            rv = call(self, fn, *args)
+            if isinstance(rv, Tail):
+                if rv.check is not None:
+                    profile.type_checks[rv.check] += 1
+                rv.check = CallEnd(profile, rv.check)
+                if not depth:
+                    # the outermost call is finished here, so that the calls
+                    # pending are ended even if the evaluation fails
+                    return rv.finish()
+                return rv
+        except BaseException:
+            profile.unwind(depth)
+            raise
+        profile.exit()
+        return rv
+
+    def validate_type(self, literal, semantics, typ):
+        self.profile.type_checks[typ] += 1
+        return super().validate_type(literal, semantics, typ)
+
+    def eval(self, node, name=None, finalize=False):
+        if name is not None:
+            self.profile.special_forms[name.name] += 1
+        return super().eval(node, name, finalize)
@@ -1,15 +1,139 @@
 """
-For a basic language with functions, the only generic type is the function type
-denoted -> for us. It looks like this: `data Type = SpecialForm | Float | String | Function [Type]`.
+For a basic language with functions, the generic types are the function type
+(denoted -> for us), lists and hashmaps. It looks like this:
+`data Type = SpecialForm | Float | String | Function [Type] | List Type | HashMap Type Type`.
 
-Includes some validation functions for the types.
+Types themselves are `TypeTag`s, which are interned. Values of the primitive types
+are plain python values (floats, strs and bools), so the `Type` classes are for the
+values that need more (like functions) and for boxing a value with a name. Includes
+some validation functions for the types.
 
 SpecialForm is another abstract base class under a type that also controls how it's evaluated.
 For independence with the context and evaluator, none of the special forms that you'd expect are initialized here.
 """
+import numbers
+import operator
+from array import array
+from collections import namedtuple
 from enum import Enum
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from hamt import HAMT
+from syntax_tree import Atom, Form
+
+class TypeTag:
+    """
+    A type: the kind of the type (like 'float' or '->') and the tags it is
+    generic over (like the arguments and return of a function).
+
+    Tags are interned, so there is only ever one tag for a type. That makes
+    equality identity (and tags usable as dictionary keys).
+    """
+    __slots__ = ('kind', 'args')
+    interned = dict()
+    def __new__(cls, kind, args=()):
+        args = tuple(as_tag(arg) for arg in args)
+        key = (kind, args)
+        rv = cls.interned.get(key)
+        if rv is None:
+            rv = super().__new__(cls)
+            rv.kind = kind
+            rv.args = args
+            cls.interned[key] = rv
+        return rv
+    def __reduce__(self):
+        return (TypeTag, (self.kind, self.args))
+    def __repr__(self):
+        if not self.args:
+            return self.kind
+        return '({} {})'.format(self.kind, ' '.join(repr(arg) for arg in self.args))
+    @property
+    def value_class(self):
+        return VALUE_CLASSES[self.kind]
+    def validate(self, value):
+        """
+        Whether the (evaluated) value is of this type. A map of another map
+        type is if its entries are (see `by_entries`).
+        """
+        return self is ANY or tag_of(value) is self or (self.kind == 'hashmap' and self.validate_entries(value))
+    def by_entries(self, other):
+        """
+        Whether values of the other type are validated as this type by their
+        entries (which takes the values, so type checking leaves it to evaluation):
+        maps made as one map type can be validated as another, like a map of
+        any keys and values made by the builtins as a map of strings to floats.
+        """
+        return self is not other and self.kind == 'hashmap' and other.kind == 'hashmap'
+    def validate_entries(self, value):
+        if type(value) is not HashMap:
+            return False
+        key, val = self.args
+        return all(key.validate(k) and val.validate(v) for k, v in value.binding.items())
+    def bind(self, value, name=None):
+        """
+        Gets a value of this type from the python value (which is just the
+        python value converted, for the primitive types).
+        """
+        if self.kind == '->':
+            return Function(self.args, value, name)
+        if self.kind == 'list':
+            return List(self.args[0], value, name)
+        if self.kind == 'hashmap':
+            return HashMap(self.args[0], self.args[1], value, name)
+        unboxed = self.value_class.unboxed
+        if unboxed is None:
+            return value
+        if not self.value_class.validate_py(value):
+            raise ValueError("{} is not a valid {}".format(value, self))
+        return unboxed(value)
+
+def as_tag(typ):
+    """
+    Gets the tag of a type, which may already be a tag or be a value
+    (or a `Type` instance standing in for its type).
+    """
+    if isinstance(typ, TypeTag):
+        return typ
+    return typ.tag
+
+def tag_of(value):
+    """
+    Gets the tag of the type of an evaluated value. Other real numbers than
+    floats (ints from the host, numpy's scalars) are floats too.
+    """
+    if isinstance(value, Type):
+        return value.tag
+    rv = UNBOXED_TAGS.get(type(value))
+    if rv is not None:
+        return rv
+    if isinstance(value, numbers.Real):
+        # (bools are real numbers too, but have their own tag)
+        return Float.tag
+    return ANY
+
+def unbox(value):
+    """
+    Gets the python value for boxed values of the primitive types.
+    """
+    if type(value) in UNBOXED_CLASSES:
+        return value.binding
+    return value
+
+TypedName = namedtuple('TypedName', ['name', 'tag'])
+
 class Type:
+    """
+    A value, possibly named. This, unqualified, stands for values of any type.
+
+    unboxed is the python type that values of the type are when evaluated,
+    if they are not boxed.
+    """
+    __slots__ = ('name', 'binding')
+    unboxed = None
     def __init__(self, name=None, binding=None):
         self.name = name
         if binding is None:
@@ -20,10 +144,13 @@ class Type:
             raise ValueError("{} is not a valid {}".format(binding, type(self)))
     def __eq__(self, other):
         """
-        Handy for type checking: ensures that the instances are the same type of type.
+        Handy for type checking: ensures that the instances (or tags) are the same type.
         """
-        return type(self) == type(other)
-    def validate_py(self, value):
+        if isinstance(other, TypeTag):
+            return self.tag is other
+        return isinstance(other, Type) and self.tag is other.tag
+    @staticmethod
+    def validate_py(value):
         # supports having Type stand in for unqualified types.
         return True
     def bind(self, value):
@@ -34,7 +161,10 @@ class Type:
         return self.binding
 
 class Float(Type):
-    def validate_py(self, value):
+    __slots__ = ()
+    unboxed = float
+    @staticmethod
+    def validate_py(value):
         try:
             v = float(value)
             return True
@@ -46,7 +176,10 @@ class Float(Type):
         self.binding = float(value)
 
 class Bool(Type):
-    def validate_py(self, value):
+    __slots__ = ()
+    unboxed = bool
+    @staticmethod
+    def validate_py(value):
         try:
             v = bool(value)
             return True
@@ -58,34 +191,189 @@ class Bool(Type):
         self.binding = bool(value)
 
 class String(Type):
-    def validate_py(self, value):
+    __slots__ = ()
+    unboxed = str
+    @staticmethod
+    def validate_py(value):
         return True
     def bind(self, value):
         if not self.validate_py(value):
             raise ValueError("{} is not a valid {}".format(value, type(self)))
         self.binding = str(value)
 
+def float_array(values):
+    """
+    Gets the floats as one contiguous array: a numpy array of float64s, or an
+    `array('d')` without numpy. Arrays that already are one aren't copied.
+
+    Raises:
+      ValueError = for values that aren't all numbers.
+    """
+    if numpy is not None:
+        if not hasattr(values, '__len__'):
+            # asarray would make a 0-d array of the iterator itself
+            try:
+                return numpy.fromiter(values, numpy.float64)
+            except (TypeError, ValueError):
+                raise ValueError("{} is not a list of floats".format(values))
+        values = numpy.asarray(values)
+        # the dtype is checked once rather than each element
+        if values.dtype.kind not in 'biuf' or values.ndim != 1:
+            raise ValueError("{} is not a list of floats".format(values))
+        return numpy.ascontiguousarray(values, dtype=numpy.float64)
+    if isinstance(values, array) and values.typecode == 'd':
+        return values
+    try:
+        return array('d', values)
+    except TypeError:
+        raise ValueError("{} is not a list of floats".format(values))
+
+class List(Type):
+    """
+    A list, generic over the type of its elements. Lists of floats are kept in
+    one contiguous array (see `float_array`) for builtins to work on whole.
+
+    The elements are validated once, when the list is made, so validating a
+    list is only a matter of its tag.
+    """
+    __slots__ = ('tag',)
+    def __init__(self, element, values=(), name=None):
+        self.tag = TypeTag('list', (element,))
+        self.name = name
+        self.bind(values)
+    @staticmethod
+    def validate_py(value):
+        return hasattr(value, '__iter__')
+    def bind(self, values):
+        element = self.tag.args[0]
+        if element is Float.tag:
+            self.binding = float_array(values)
+            return
+        values = tuple(values)
+        if element is not ANY and not all(element.validate(value) for value in values):
+            raise ValueError("{} is not a {}".format(values, self.tag))
+        self.binding = values
+    def __len__(self):
+        return len(self.binding)
+    def __iter__(self):
+        return iter(self.binding)
+
+class HashMap(Type):
+    """
+    A map, generic over the types of its keys and values, kept in a persistent
+    `hamt.HAMT` so that updates share structure with the map updated.
+
+    Like lists, the entries are validated when the map is made and validating
+    a map is a matter of its tag.
+    """
+    __slots__ = ('tag',)
+    def __init__(self, key, value, entries=(), name=None):
+        self.tag = TypeTag('hashmap', (key, value))
+        self.name = name
+        self.bind(entries)
+    @staticmethod
+    def validate_py(value):
+        return hasattr(value, 'items') or hasattr(value, '__iter__')
+    def bind(self, entries):
+        key, value = self.tag.args
+        if not isinstance(entries, HAMT):
+            try:
+                entries = HAMT(entries)
+            except TypeError:
+                raise ValueError("{} is not a {}".format(entries, self.tag))
+        if (key is not ANY or value is not ANY) and \
+                not all(key.validate(k) and value.validate(v) for k, v in entries.items()):
+            raise ValueError("{} is not a {}".format(entries, self.tag))
+        self.binding = entries
+    def updated(self, entries):
+        """
+        Gets a map of the same type with the entries (a `hamt.HAMT` of valid entries).
+        """
+        rv = HashMap.__new__(HashMap)
+        rv.tag, rv.name, rv.binding = self.tag, None, entries
+        return rv
+    def __len__(self):
+        return len(self.binding)
+
 class Function(Type):
+    __slots__ = ('gen', 'tag', 'checked_return', 'pure')
     def __init__(self, inners, binding, name=None):
-        self.gen = inners
+        self.gen = tuple(as_tag(inner) for inner in inners)
+        self.tag = TypeTag('->', self.gen)
+        # whether the binding is known to return the return type
+        self.checked_return = False
+        # whether calls with the same arguments always give the same value (and
+        # do nothing else), so they can be made ahead of time (see `optimize`)
+        self.pure = False
         super().__init__(name, binding)
-    def __eq__(self, other):
-        return type(self) == type(other) \
-                and all(s == o or s is None or o is None for s, o in zip(self.gen, other.gen))
-    def validate_py(self, value):
+    @staticmethod
+    def validate_py(value):
         return hasattr(value, '__call__')
-    def __call__(self, *args):
+    def check_args(self, args):
         if len(args) != len(self.gen) - 1:
             raise ValueError("Arity incorrect, {} expected {} args.".format(self.name, len(self.gen) - 1))
-        if any(not typ.validate_py(arg) for arg, typ in zip(args, self.gen[:-1])):
-            raise ValueError("Type error in function invocation of {} and args {}".format(self.name, args))
-        return self.get()(*args)
+        for arg, typ in zip(args, self.gen):
+            if not typ.validate(arg):
+                raise ValueError("Type error in function invocation of {} and args {}".format(self.name, args))
+    def check_return(self, value):
+        if not self.checked_return and not self.gen[-1].validate(value):
+            raise ValueError("Type error in the return of {}: {}".format(self.name, value))
+        return value
+    def __call__(self, *args):
+        self.check_args(args)
+        return self.check_return(self.get()(*args))
+    def tail_call(self, *args, checked=False):
+        """
+        Like calling the function, but if the binding can give its body as a
+        `Tail` (by having a `tail` method), that is returned instead of being
+        evaluated, with the return type as the check.
+
+        checked being true means that the arguments are known to type check
+        (see `context.BaseContext.check`), so they aren't validated again.
+        """
+        if not checked:
+            self.check_args(args)
+        binding = self.get()
+        if not hasattr(binding, 'tail'):
+            return self.check_return(binding(*args))
+        rv = binding.tail(*args)
+        if not self.checked_return and self.gen[-1] is not ANY:
+            rv.check = self.gen[-1]
+        return rv
+
+class Tail:
+    """
+    The rest of an evaluation left for the evaluator to finish: the node is
+    to be evaluated in the context, and the result validated by the check
+    (a type), if any.
+
+    Calls and special forms give these back for expressions in tail position
+    so that evaluators can reuse their frame for them (see `tokenizer.evaluate_tree`).
+    """
+    __slots__ = ('node', 'context', 'check')
+    def __init__(self, node, context, check=None):
+        self.node = node
+        self.context = context
+        self.check = check
+    def finish(self):
+        """
+        Evaluates the rest.
+        """
+        rv = self.context.eval(self.node)
+        if self.check is not None and not self.check.validate(rv):
+            raise ValueError("Type error in the return: {} is not a {}".format(rv, self.check))
+        return rv
 
 class SpecialForm(Type):
-    def evaluate(self, tokens, context, index):
-        pass
-    def validate_py(self, value):
+    @staticmethod
+    def validate_py(value):
         return False
+    def evaluate(self, node, context):
+        """
+        Evaluates the special form given the unevaluated syntax tree
+        of its occurrence (a `syntax_tree.Form` with it at the head).
+        """
+        pass
 
 class SpecialFormSpec(Enum):
     """
@@ -94,6 +382,10 @@ class SpecialFormSpec(Enum):
     list of whitespace delimited names within a pair of parenthesis.
     Expr is any expression -- it is not evaluated. Evaled_expr are
     evaluated.
+
+    A name binds in the scope the special form is evaluated in, while
+    a list of names binds in a new scope for the expressions after it
+    (like the arguments of a function for its body).
     """
     NAME = 1,
     LIST_OF_NAME = 2,
@@ -105,12 +397,22 @@ class SpecialFormFactory:
     Makes and stores special forms.
 
     An instance is aware of all the forms it's called to support and will
-    create classes that parse the arguments and then call a function to have
-    the true binding processed.
+    create special forms that parse the arguments and then call a function
+    to have the true binding processed.
     """
     def __init__(self, non_literals):
         self.forms = dict()
+        self.specs = dict()
+        self.binders = dict()
         self.non_literal = non_literals
+    def __getstate__(self):
+        # the forms are remade (so pickled as their names, see `__call__`)
+        return self.non_literal, [(name, self.binders[name], self.specs[name]) for name in self.forms]
+    def __setstate__(self, state):
+        non_literals, forms = state
+        self.__init__(non_literals)
+        for name, binder, specs in forms:
+            self(name, binder, *specs)
     def __contains__(self, name):
         return name in self.forms
     def __getitem__(self, name):
@@ -128,86 +430,135 @@ class SpecialFormFactory:
             return token
         else:
             raise ValueError("{} is not an identifier".format(token))
+    def parse_name(self, node):
+        """
+        Gets the `TypedName` for the possibly annotated atom.
+        Names without annotations can be of any type.
+        """
+        if not isinstance(node, Atom):
+            raise ValueError("Expected identifier not {}".format(node))
+        name = self.ensure_is_name(node.token)
+        if node.annotation is None:
+            return TypedName(name, ANY)
+        return TypedName(name, as_tag(node.annotation[1]))
+    def parse_names(self, node):
+        """
+        Gets the `TypedName`s in the list of names.
+        """
+        if not isinstance(node, Form):
+            raise ValueError("Expected list of names not {}".format(node))
+        return [self.parse_name(n) for n in node.children]
     def __call__(self, name, binder, *allowed_sub_bodies):
         """
         Adds an instance of a special form to the factory.
 
-        The name is the name of the special form, the binder gets the parsed arguments
-        to bind to the context. The allowed_sub_bodies are expected to be specs for the
+        The name is the name of the special form, the binder gets the context the form
+        is evaluated in and then the parsed arguments to bind to the context. The allowed_sub_bodies are expected to be specs for the
         arguments.
 
+        The specs are turned into a parser once, here. As all but the evaluated arguments
+        only depend on the syntax tree, they are parsed once per occurrence of the special
+        form and kept (for up to `max_sites` occurrences).
+
         Returns: a special form that, when evaluated, parses, and then binds as per the binder.
-                 (Calls the binder.) Recall that this returns as class, so it'll have to be
-                 instantiated per occurance of the intended special form (so that the binding
-                 also functions as expected).
+                 (Calls the binder.) The one instance serves every occurrence and is how the
+                 special form is referred to as a value.
         """
-        factory_self = self
+        steps = []
+        for spec in allowed_sub_bodies:
+            if spec == SpecialFormSpec.NAME:
+                steps.append(self.parse_name)
+            elif spec == SpecialFormSpec.LIST_OF_NAME:
+                steps.append(self.parse_names)
+            else:
+                # expressions are kept as they are, evaluated ones until evaluation
+                steps.append(None)
+        steps = tuple(steps)
+        evaled = tuple(i for i, spec in enumerate(allowed_sub_bodies) if spec == SpecialFormSpec.EVALED_EXPR)
+        arity = len(steps)
+        factory = self
+
         class DefinedSpecialForm(SpecialForm):
-            def evaluate(self, tokens, context, index):
-                bodies_idx = 0
-                bindings = []
-                while bodies_idx < len(allowed_sub_bodies):
-                    if allowed_sub_bodies[bodies_idx] == SpecialFormSpec.NAME:
-                        if index >= len(tokens):
-                            raise ValueError("Expected identifier to complete {}".format(name))
-                        if index + 1 < len(tokens) and tokens[index + 1] == '?':
-                            _, t, index = context.eval_type(tokens, index + 1)
-                        else:
-                            t = Type
-                            index = index + 1
-                        bindings.append(t(factory_self.ensure_is_name(tokens[index])))
-                        bodies_idx += 1
-                    elif allowed_sub_bodies[bodies_idx] == SpecialFormSpec.LIST_OF_NAME:
-                        names = []
-                        if index >= len(tokens):
-                            raise ValueError("Expected list of names to define {}".format(name))
-                        if tokens[index] != '(':
-                            raise ValueError("Expected '(' to open list of names")
-                        index += 1
-                        while index < len(tokens) and tokens[index] != ')':
-                            if index + 1 < len(tokens) and tokens[index + 1] == '?':
-                                _, t, index = context.eval_type(tokens, index + 1)
-                            else:
-                                t = Type
-                                index = index + 1
-                            names.append(t(factory_self.ensure_is_name(tokens[index])))
-                        if index >= len(tokens) or index[tokens] != ')':
-                            raise ValueError("Expected ')' to end definition")
-                        index += 1
-                        bodies_idx += 1
-                    elif allowed_sub_bodies[bodies_idx] == SpecialFormSpec.EXPR:
-                        if index >= len(tokens):
-                            raise ValueError("Expected value to be defined")
-                        if tokens[index] != '(':
-                            u_parse = [tokens[index]]
-                        else:
-                            num_parens = 1
-                            next_index = index + 1
-                            while num_parens > 0 and next_index < len(tokens):
-                                if tokens[next_index] == '(':
-                                    num_parens += 1
-                                elif tokens[next_index] == ')':
-                                    num_parens -= 1
-                            if num_parens != 0:
-                                raise ValueError("Mismatched parens in function definition")
-                            index = next_index
-                            u_parse = tokens[index: next_index + 1]
-                        if index + 1 >= len(tokens) or tokens[index + 1] != ')':
-                            raise ValueError("Expected closing parens to end function definition")
-                        index = index + 2
-                        bindings.append(u_parse)
-                    elif allowed_sub_bodies[bodies_idx] == SpecialFormSpec.EVALED_EXPR:
-                        bind, index = context.eval(tokens, index)
-                if index + 1 >= len(tokens) or tokens[index + 1]:
-                    raise ValueError("Expected closing paren")
-                self.bind(binder(*bindings))
-                return self, index + 2
-
-        # indentation: outside the inner class now (factory_self and self are the same here)
-        self.forms[name] = DefinedSpecialForm
-        return DefinedSpecialForm
-
-def wrap_py_fn(fn, name, *types):
-    def wrapt(*args):
-        return fn(*(arg.get() for arg in args))
-    return Function(types, name, wrapt)
+            max_sites = 1 << 12
+            def __init__(self):
+                super().__init__(name)
+                # id of the form -> (form, parsed arguments)
+                self.sites = dict()
+            def __reduce__(self):
+                return (operator.getitem, (factory, name))
+            def parse(self, node):
+                """
+                Parses the arguments of the occurrence of this special form in the node.
+                """
+                args = node.children[1:]
+                if len(args) != arity:
+                    raise ValueError("{} expects {} arguments".format(name, arity))
+                parsed = tuple(arg if step is None else step(arg) for step, arg in zip(steps, args))
+                if len(self.sites) >= self.max_sites:
+                    self.sites.clear()
+                self.sites[id(node)] = (node, parsed)
+                return parsed
+            if evaled:
+                def evaluate(self, node, context):
+                    site = self.sites.get(id(node))
+                    parsed = site[1] if site is not None and site[0] is node else self.parse(node)
+                    bindings = list(parsed)
+                    for i in evaled:
+                        bindings[i] = context.eval(parsed[i])
+                    return binder(context, *bindings)
+            else:
+                def evaluate(self, node, context):
+                    site = self.sites.get(id(node))
+                    parsed = site[1] if site is not None and site[0] is node else self.parse(node)
+                    return binder(context, *parsed)
+
+        self.forms[name] = DefinedSpecialForm()
+        self.specs[name] = allowed_sub_bodies
+        self.binders[name] = binder
+        return self.forms[name]
+
+class Converted:
+    """
+    A python function with what it returns converted (see `wrap_py_fn`).
+    It can be pickled if the function can.
+    """
+    __slots__ = ('fn', 'convert')
+    def __init__(self, fn, convert):
+        self.fn = fn
+        self.convert = convert
+    def __call__(self, *args):
+        return self.convert(self.fn(*args))
+
+def wrap_py_fn(fn, name, *types, pure=False):
+    """
+    Makes a Function out of a python function over the bindings of the types
+    given (the last of which is the return type). pure marks the function as
+    having no effects besides its value (see `Function.pure`).
+    """
+    returns = as_tag(types[-1])
+    convert = returns.value_class.unboxed
+    if convert is None:
+        rv = Function(types, fn, name)
+    else:
+        rv = Function(types, Converted(fn, convert), name)
+        rv.checked_return = True
+    rv.pure = pure
+    return rv
+
+VALUE_CLASSES = {
+    'any': Type,
+    'float': Float,
+    'bool': Bool,
+    'string': String,
+    '->': Function,
+    'list': List,
+    'hashmap': HashMap,
+    'special-form': SpecialForm,
+}
+ANY = Type.tag = TypeTag('any')
+Float.tag = TypeTag('float')
+Bool.tag = TypeTag('bool')
+String.tag = TypeTag('string')
+SpecialForm.tag = TypeTag('special-form')
+UNBOXED_TAGS = {cls.unboxed: cls.tag for cls in [Float, Bool, String]}
+UNBOXED_CLASSES = frozenset([Float, Bool, String])
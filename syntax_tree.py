@@ -0,0 +1,78 @@
+"""
+The parsed form of programs: an immutable tree built once from the
+token list by `tokenizer.parse` and walked by `tokenizer.evaluate_tree`.
+
+There are only two sorts of node (as per the BNF in the readme): an atom,
+which is a single token, and a form, which is a parenthesized list of nodes.
+Either may carry the `?semantics:type` annotation that followed it, already
+resolved through the context as the `(semantics, type)` pair.
+
+A context may also resolve a tree (see `AbstractContext.resolve`), replacing
+atoms with constants and variables addressed by scope depth and slot, and
+marking the scopes that special forms open. Checking a tree further marks
+what needn't be validated when evaluating it.
+"""
+from collections import namedtuple
+
+class Atom(namedtuple('Atom', ['token', 'annotation'])):
+    """
+    A single token, like a name or a literal.
+    """
+    __slots__ = ()
+    def __new__(cls, token, annotation=None):
+        return super().__new__(cls, token, annotation)
+
+class Form(namedtuple('Form', ['children', 'annotation'])):
+    """
+    A parenthesized list of nodes, like a call or a special form.
+    """
+    __slots__ = ()
+    def __new__(cls, children, annotation=None):
+        return super().__new__(cls, tuple(children), annotation)
+    @property
+    def head(self):
+        if not self.children:
+            raise ValueError("Empty form cannot be evaluated")
+        return self.children[0]
+    @property
+    def args(self):
+        return self.children[1:]
+
+class Const(namedtuple('Const', ['value', 'annotation'])):
+    """
+    An atom already evaluated to the value it stands for.
+    """
+    __slots__ = ()
+    def __new__(cls, value, annotation=None):
+        return super().__new__(cls, value, annotation)
+
+class Var(namedtuple('Var', ['name', 'depth', 'slot', 'annotation'])):
+    """
+    A variable: depth is the number of scopes out from where it's used
+    that it is bound and slot is its index in that scope (or its name,
+    for the global scope).
+    """
+    __slots__ = ()
+    def __new__(cls, name, depth, slot, annotation=None):
+        return super().__new__(cls, name, depth, slot, annotation)
+
+class Scope(namedtuple('Scope', ['names', 'body', 'checked'])):
+    """
+    The expression in a new scope with the names (in slot order) bound
+    therein. Special forms get these in place of the expressions after a
+    list of names (see `sem_lang_types.SpecialFormSpec`) -- it is not an
+    expression in itself.
+
+    checked is whether the body is known to be of the type it's meant to
+    be (like the return type of a function).
+    """
+    __slots__ = ()
+    def __new__(cls, names, body, checked=False):
+        return super().__new__(cls, names, body, checked)
+
+class CheckedForm(Form):
+    """
+    A call known to type check (see `AbstractContext.check`), so the
+    arguments needn't be validated when it is evaluated.
+    """
+    __slots__ = ()
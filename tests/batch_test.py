@@ -0,0 +1,86 @@
+import operator
+import os
+import pickle
+
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import batch
+import lists
+import hashmaps
+
+from testing_utils import *
+
+def make_context():
+    literals = math_literals()
+    literals.update(lists.list_literals())
+    literals.update(hashmaps.hashmap_literals())
+    return ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
+
+def exit_worker(code):
+    os._exit(int(code))
+
+def make_failing_context():
+    ctx = make_context()
+    ctx.lexical_vars['/'] = types.wrap_py_fn(operator.truediv, '/', types.Float(), types.Float(), types.Float())
+    ctx.lexical_vars['exit'] = types.wrap_py_fn(exit_worker, 'exit', types.Float(), types.Float())
+    return ctx
+
+FACT = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))"
+SOURCES = [
+    FACT + " (fact 5)",
+    '(+ 1 "two")',
+    "(def! spin (n) (spin (+ n 1))) (spin 0)",
+    "(fact 3)",
+    '(lookup (assoc (hashmap) "a" (range 3)) "a")',
+    "(def! f (x) x) f",
+]
+
+def check_results(results):
+    assert [r.index for r in results] == list(range(len(SOURCES)))
+    assert results[0].value == 120 and results[0].type is types.Float.tag and results[0].error is None
+    assert results[1].error.startswith('ValueError')
+    assert results[2].error.startswith('BudgetExceeded')
+    # each program is in a context of its own
+    assert results[3].error == 'ValueError: fact is not bound'
+    assert list(results[4].value) == [0, 1, 2] and results[4].type is lists.FLOAT_LIST
+    assert results[5].type.kind == '->'
+
+def test_batch_in_process():
+    check_results(list(batch.evaluate_batch(SOURCES, make_context, workers=0, max_steps=1000)))
+
+def test_batch_process_pool():
+    results = list(batch.evaluate_batch(iter(SOURCES), make_context, workers=2, max_steps=1000))
+    check_results(results)
+    unordered = batch.evaluate_batch(SOURCES, make_context, workers=2, max_steps=1000, ordered=False)
+    check_results(sorted(unordered))
+
+def test_batch_survives_errors():
+    sources = ['(+ 1 2)', '(/ 1 0)', '(+ 2 2)']
+    for workers in (0, 2):
+        results = list(batch.evaluate_batch(sources, make_failing_context, workers=workers))
+        assert [r.value for r in results] == [3, None, 4]
+        assert results[1].error.startswith('ZeroDivisionError')
+    # a worker dying fails its programs, and the rest run in a new pool
+    sources = ['(+ 1 2)', '(exit 1)'] + ['(+ 2 2)'] * 8
+    results = list(batch.evaluate_batch(sources, make_failing_context, workers=1))
+    assert [r.index for r in results] == list(range(len(sources)))
+    assert results[0].value == 3 and results[1].error.startswith('BrokenProcessPool')
+    assert all(r.value == 4 for r in results[5:])
+
+def test_batch_timeout():
+    spin = "(def! spin (n) (spin (+ n 1))) (spin 0)"
+    result, = batch.evaluate_batch([spin], make_context, workers=0, timeout=0.2)
+    assert result.error.startswith('Timeout')
+
+def test_contexts_pickle():
+    ctx = make_context()
+    run(FACT, ctx, resolved)
+    copy = pickle.loads(pickle.dumps(ctx))
+    assert copy.special_forms['def!'] is not ctx.special_forms['def!']
+    assert copy.literal('def!') is copy.special_forms['def!']
+    assert is_type_with_binding(batch.evaluate_source("(fact 4)", copy), types.Float, 24)
+    assert is_type_with_binding(batch.evaluate_source("(sum (range 4))", copy), types.Float, 6)
+    # the special forms in the copied function's body are the copy's
+    body = copy.lexical_vars['fact'].binding.body
+    assert body.children[0].value is copy.special_forms['if!']
@@ -0,0 +1,20 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import run as benchmarks
+
+def test_benchmarks_run(tmp_path):
+    # tiny, just to keep the workloads working
+    output = str(tmp_path / 'results.json')
+    results = benchmarks.main(['--scale', '0.01', '--repeat', '1', '--output', output])
+    assert set(results['results']) == set(benchmarks.WORKLOADS)
+    for result in results['results'].values():
+        assert result['throughput'] > 0 and result['peak_bytes'] > 0
+    with open(output) as f:
+        assert json.load(f) == results
+    reported = []
+    benchmarks.compare(results, results, reported.append)
+    assert len(reported) == len(results['results']) + 1 and '1.00x' in reported[1]
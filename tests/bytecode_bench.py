@@ -0,0 +1,41 @@
+"""
+Time of the tree evaluator against the bytecode VM on call-heavy programs
+(checked and not). Run it directly: `python tests/bytecode_bench.py [n]`.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import bytecode as bc
+import context as ctxs
+import tokenizer as tok
+from testing_utils import math_literals
+
+PROGRAMS = {
+    'fib': "(def! fib?F:float (n?F:float) (if! (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (fib {})",
+    'loop': "(def! loop?F:float (n?F:float acc?F:float) (if! (< n 1) acc (loop (- n 1) (+ acc n)))) (loop {} 0)",
+}
+
+def timed(evaluator, source, prepare):
+    ctx = ctxs.BaseContext(evaluator, tok.parse_type, math_literals())
+    nodes = [prepare(ctx, node) for node in tok.parse_program(list(tok.tokenize(source)), ctx)]
+    start = time.perf_counter()
+    for node in nodes:
+        rv = evaluator(node, ctx)
+    return rv, time.perf_counter() - start
+
+def main(n=18):
+    sizes = {'fib': n, 'loop': 1000 * n}
+    for name, program in sorted(PROGRAMS.items()):
+        source = program.format(sizes[name])
+        for how, prepare in (('resolved', ctxs.BaseContext.resolve), ('checked', ctxs.BaseContext.check)):
+            tree_rv, tree_time = timed(tok.evaluate_tree, source, prepare)
+            vm_rv, vm_time = timed(bc.evaluate, source, prepare)
+            assert tree_rv == vm_rv
+            print("{:5} {:8}: tree {:7.3f}s  vm {:7.3f}s  speedup {:.1f}x".format(
+                name, how, tree_time, vm_time, tree_time / vm_time))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,80 @@
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import bytecode as bc
+
+from testing_utils import *
+
+def vm_context():
+    return ctxs.BaseContext(bc.evaluate, tok.parse_type, math_literals())
+
+PROGRAMS = [
+    ("(if! (< 1 2) 3 4)", 3),
+    ("(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1))))) (fact 5)", 120),
+    ("(def! fib (n) (if! (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (fib 10)", 55),
+    ("(def! f (x y) (if! (def! g () (* x y)) (g) 0)) (f 3 4)", 12),
+    ("(def! count (n acc) (if! (< n 1) acc (count (- n 1) (+ acc 1)))) (count 50 0)", 50),
+    ("(+ (if! 0 1 2) 3)?F:float", 5),
+]
+
+def test_vm_matches_tree_evaluator():
+    for prepare in (resolved, checked):
+        for source, expected in PROGRAMS:
+            tree_ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+            rv = run(source, vm_context(), prepare, bc.evaluate)
+            assert is_type_with_binding(rv, types.Float, expected)
+            assert rv == run(source, tree_ctx, prepare)
+
+def test_vm_compiles():
+    ctx = vm_context()
+    tree = ctx.resolve(tok.parse(list(tok.tokenize("(if! (< 1 2) (+ 1 2) 4)")), ctx)[0])
+    ops = [op for op, _ in bc.compile_tree(tree, ctx).disassemble()]
+    assert ops == ['LOAD_GLOBAL', 'LOAD_CONST', 'LOAD_CONST', 'CALL', 'JUMP_IF_FALSE',
+            'LOAD_GLOBAL', 'LOAD_CONST', 'LOAD_CONST', 'TAIL_CALL', 'LOAD_CONST', 'RETURN']
+    assert bc.compile_tree(tree, ctx) is bc.compile_tree(tree, ctx)
+    run("(def! f (x) (g x x))", ctx, resolved, bc.evaluate)
+    body = ctx.lexical_vars['f'].binding.template.code.disassemble()
+    assert body == [('LOAD_GLOBAL', 0), ('LOAD_LOCAL', 0), ('LOAD_LOCAL', 0), ('TAIL_CALL', 2)]
+
+def test_vm_deep_tail_calls():
+    ctx = vm_context()
+    down = "(def! down (n) (if! (< n 1) n (down (- n 1)))) (down 100000)"
+    assert is_type_with_binding(run(down, ctx, checked, bc.evaluate), types.Float, 0)
+    deep = "(def! sum (n) (if! (< n 1) 0 (+ n (sum (- n 1))))) (sum 10000)"
+    assert is_type_with_binding(run(deep, ctx, resolved, bc.evaluate), types.Float, 50005000)
+
+def test_vm_type_errors():
+    ctx = vm_context()
+    run("(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))", ctx, resolved, bc.evaluate)
+    expect_value_error(lambda: run('(fact "five")', ctx, resolved, bc.evaluate))
+    expect_value_error(lambda: run('(+ 1 2)?F:string', ctx, resolved, bc.evaluate))
+    expect_value_error(lambda: run('(def! s?F:string (x) x) (s 1)', ctx, resolved, bc.evaluate))
+    expect_value_error(lambda: run('(1 2)', ctx, resolved, bc.evaluate))
+    expect_value_error(lambda: run('(nope 2)', ctx, resolved, bc.evaluate))
+
+def test_vm_falls_back_to_the_tree():
+    # trees that aren't resolved are still evaluated
+    ctx = vm_context()
+    rv = run("(def! sq (x) (* x x)) (sq 3)", ctx, evaluator=bc.evaluate)
+    assert is_type_with_binding(rv, types.Float, 9)
+
+def test_vm_memoized_functions():
+    ctx = vm_context()
+    fib = "(defmemo! fib (n) (if! (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (fib 60)"
+    assert is_type_with_binding(run(fib, ctx, checked, bc.evaluate), types.Float, 1548008755920)
+    assert ctx.memo.info().misses == 61
+
+def test_vm_budget():
+    ctx = vm_context()
+    ctx.budget = ctxs.Budget(max_steps=1000)
+    try:
+        run("(def! spin (n) (spin (+ n 1))) (spin 0)", ctx, checked, bc.evaluate)
+        assert False
+    except ctxs.BudgetExceeded as e:
+        assert e.resource == 'steps'
+    ctx.budget = ctxs.Budget(max_allocations=100)
+    try:
+        run("(spin 0)", ctx, checked, bc.evaluate)
+        assert False
+    except ctxs.BudgetExceeded as e:
+        assert e.resource == 'allocations'
@@ -0,0 +1,54 @@
+import os
+
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import compile_cache as cc
+
+from testing_utils import *
+
+PRELUDE = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))\n(fact 5)\n"
+
+def make_context():
+    return ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+
+def test_cache_round_trip(tmp_path, monkeypatch):
+    source = tmp_path / 'prelude.sem'
+    source.write_text(PRELUDE)
+    ctx = make_context()
+    nodes = cc.load_program(str(source), ctx)
+    assert os.path.exists(cc.cache_path(str(source)))
+    assert is_type_with_binding(evaluate_all(nodes, ctx), types.Float, 120)
+    def no_parsing(*args):
+        assert False, "parsed again"
+    monkeypatch.setattr(tok, 'parse_program', no_parsing)
+    other = make_context()
+    cached = cc.load_program(str(source), other)
+    assert cached == nodes
+    # special forms are those of the context loading the trees
+    assert cached[0].children[0].value is other.special_forms['def!']
+    assert is_type_with_binding(evaluate_all(cached, other), types.Float, 120)
+
+def test_cache_invalidation(tmp_path):
+    source = tmp_path / 'prelude.sem'
+    source.write_text(PRELUDE)
+    ctx = make_context()
+    resolved = cc.load_program(str(source), ctx)
+    # a different stage or source is compiled again
+    parsed = cc.load_program(str(source), ctx, resolve=False)
+    assert parsed != resolved and parsed == cc.compile_source(PRELUDE, ctx, resolve=False)
+    source.write_text("(+ 1 2)")
+    assert is_type_with_binding(evaluate_all(cc.load_program(str(source), ctx), ctx), types.Float, 3)
+    # as is a corrupt cache
+    with open(cc.cache_path(str(source)), 'r+b') as f:
+        f.seek(cc.HEADER_SIZE)
+        f.write(b'junk')
+    assert cc.load_program(str(source), ctx) == cc.compile_source("(+ 1 2)", ctx)
+
+def test_cache_dir(tmp_path):
+    source = tmp_path / 'prelude.sem'
+    source.write_text(PRELUDE)
+    cache_dir = tmp_path / 'cache'
+    cc.load_program(str(source), make_context(), cache_dir=str(cache_dir))
+    assert os.listdir(str(cache_dir)) == ['prelude.sem.semc']
+    assert not os.path.exists(str(tmp_path / cc.CACHE_DIR))
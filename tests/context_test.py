@@ -1,6 +1,7 @@
 import tokenizer as tok
 import context as ctxs
 import sem_lang_types as types
+from syntax_tree import Atom, Form, Const, Var, Scope, CheckedForm
 
 import pytest
 
@@ -11,13 +12,16 @@ def test_base_literal():
         'foo': types.Float('foo', 9.5),
         'bar': types.String('bar', "LOL spaces ain't supported")
     }
-    ctx = ctxs.BaseContext(tok.evaluate, tok.parse_type, literals)
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
     assert is_type_with_binding(ctx.literal('9.5'), types.Float, 9.5)
     assert is_type_with_binding(ctx.literal('"This is not yet OK by the tokenizer"'),
             types.String, "This is not yet OK by the tokenizer")
     assert is_type_with_binding(ctx.literal('foo'), types.Float, 9.5)
     assert is_type_with_binding(ctx.literal('bar'), types.String, "LOL spaces ain't supported")
     expect_value_error(lambda: ctx.literal('baz'))
+    # a name bound to None is still a name, not a literal to classify
+    ctx.lexical_vars['1'] = None
+    assert ctx.literal('1') is None
 
 def test_base_call():
     literals = {
@@ -26,7 +30,7 @@ def test_base_call():
         'fn': types.Function((types.Type(), types.Type()), lambda x: x, 'fn'),
         'inc': types.Function((types.Float(), types.Float()), lambda x: x + 1, 'inc'),
     }
-    ctx = ctxs.BaseContext(tok.evaluate, tok.parse_type, literals)
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
     expect_value_error(lambda: ctx.call('halp'))
     expect_value_error(lambda: ctx.call('foo'))
     expect_value_error(lambda: ctx.call('fn'))
@@ -38,9 +42,249 @@ def test_base_call():
     assert ctx.call(literals['fn'], 5.6) == 5.6
 
 def test_base_type_getter():
-    ctx = ctxs.BaseContext(tok.evaluate, tok.parse_type, dict())
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, dict())
     assert ctx.get_type(None, 'string') == types.String()
     assert ctx.get_type(None, 'float') == types.Float()
     assert ctx.get_type(None, '->', types.Float(), types.Float())\
             == types.Function((types.Float(), types.Float()), lambda x: x)
     expect_value_error(lambda: ctx.get_type(None, 'not-a-type'))
+
+def test_base_def_and_if():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    assert is_type_with_binding(run("(if! (< 1 2) 3 4)", ctx), types.Float, 3)
+    assert is_type_with_binding(run("(if! (< 2 1) 3 4)", ctx), types.Float, 4)
+    fact = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))"
+    assert is_type_with_binding(run(fact + " (fact 5)", ctx), types.Float, 120)
+    assert ctx.lexical_vars['fact'].gen == (types.Float(), types.Float())
+    expect_value_error(lambda: run('(fact "five")', ctx))
+
+def test_base_def_body_parsed_once():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    run("(def! sq (x) (* x x))", ctx)
+    tokens = list(tok.tokenize("(sq 3)"))
+    tree, _ = tok.parse(tokens, ctx)
+    assert is_type_with_binding(tok.evaluate_tree(tree, ctx), types.Float, 9)
+    assert is_type_with_binding(tok.evaluate(tokens, ctx)[0], types.Float, 9)
+
+def test_environment():
+    env = ctxs.Environment({'a': 1, 'b': 2})
+    inner = env.child({'a': 3})
+    assert inner['a'] == 3 and inner['b'] == 2 and env['a'] == 1
+    assert 'b' in inner and 'c' not in inner
+    inner['c'] = 4
+    assert 'c' not in env
+    try:
+        inner['d']
+    except KeyError:
+        pass
+    else:
+        assert False
+
+def test_base_calls_do_not_copy_scope():
+    literals = math_literals()
+    literals.update(('global-{}'.format(i), types.Float(binding=i)) for i in range(10000))
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
+    frames = []
+    real_child = ctx.child
+    def spy_child(frame):
+        frames.append(frame)
+        return real_child(frame)
+    ctx.child = spy_child
+    run("(def! count (n) (if! (< n 1) global-5 (count (- n 1))))", ctx)
+    assert is_type_with_binding(run("(count 50)", ctx), types.Float, 5)
+    assert len(frames) == 51 and all(list(frame) == ['n'] for frame in frames)
+    del ctx.child
+    # definitions in a function body stay in that function's scope
+    run("(def! outer (x) (if! (def! inner () x) (inner) 0))", ctx)
+    assert is_type_with_binding(run("(outer 7)", ctx), types.Float, 7)
+    assert 'inner' not in ctx.lexical_vars
+
+def test_base_resolve():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    tree, _ = tok.parse(list(tok.tokenize('(def! f (x y) (if! (def! g () (* x y)) (g) "no"))')), ctx)
+    def_form, if_form = Const(ctx.special_forms['def!']), Const(ctx.special_forms['if!'])
+    assert ctx.resolve(tree) == Form((
+        def_form, Atom('f'), Form((Atom('x'), Atom('y'))),
+        Scope(('x', 'y', 'g'), Form((
+            if_form,
+            Form((def_form, Atom('g'), Form(()),
+                  Scope((), Form((Var('*', 2, '*'), Var('x', 1, 0), Var('y', 1, 1)))))),
+            Form((Var('g', 0, 2),)),
+            Const('no'))))))
+    plus = ctx.resolve(tok.parse(list(tok.tokenize('(+ 1.5 z?F:float)')), ctx)[0])
+    assert plus.children[1].value == 1.5
+    assert plus.children[2] == Var('z', 0, 'z', (None, types.Float()))
+    # a bound name that looks like a literal is the name, resolved or not
+    ctx.lexical_vars['inf'] = 5.0
+    assert is_type_with_binding(run("(+ inf 1)", ctx), types.Float, 6)
+    assert is_type_with_binding(run("(+ inf 1)", ctx, resolved), types.Float, 6)
+
+def test_base_resolved_evaluation():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    fact = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))"
+    assert is_type_with_binding(run(fact + " (fact 5)", ctx, resolved), types.Float, 120)
+    run("(def! outer (x) (if! (def! inner () x) (inner) 0))", ctx, resolved)
+    assert is_type_with_binding(run("(outer 7)", ctx, resolved), types.Float, 7)
+    assert 'inner' not in ctx.lexical_vars
+    expect_value_error(lambda: run("(undefined 1)", ctx, resolved))
+
+def test_tail_calls_take_no_stack():
+    # well past python's recursion limit
+    depth = 10 ** 6
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    run("(def! down (n) (if! n (down (- n 1)) n))", ctx, resolved)
+    assert is_type_with_binding(run("(down {})".format(depth), ctx, resolved), types.Float, 0)
+    # through annotations and typed returns, unresolved
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    run("(def! loop?F:float (n acc?F:float) (if! (< n 1) acc (loop (- n 1) (+ acc 2)?F:float)))", ctx)
+    assert is_type_with_binding(run("(loop 50000 0)", ctx), types.Float, 100000)
+    expect_value_error(lambda: run('(def! bad?F:float (n) (if! n (bad (- n 1)) "oops")) (bad 5000)', ctx))
+
+def test_stack_evaluator_deep_recursion():
+    depth = 10 ** 5
+    ctx = ctxs.BaseContext(tok.evaluate_stack, tok.parse_type, math_literals())
+    sum_to = "(def! sum?F:float (n) (if! (< n 1) 0 (+ n (sum (- n 1)))))"
+    nodes = [ctx.resolve(node) for node in tok.parse_program(list(tok.tokenize(sum_to + " (sum {})".format(depth))), ctx)]
+    rv = None
+    for node in nodes:
+        rv = tok.evaluate_stack(node, ctx)
+    assert is_type_with_binding(rv, types.Float, depth * (depth + 1) / 2)
+    rv = tok.evaluate_stack(tok.parse(list(tok.tokenize("(if! (< 1 2) (sum 3)?F:float 4)")), ctx)[0], ctx)
+    assert is_type_with_binding(rv, types.Float, 6)
+    expect_value_error(lambda: tok.evaluate_stack(tok.parse(list(tok.tokenize("(sum 3)?F:string")), ctx)[0], ctx))
+
+def test_alternating_tail_checks_stay_bounded(monkeypatch):
+    # the annotation on the tail call and the return type alternate
+    source = "(def! down?F:float (n) (if! (< n 1) 0 (down (- n 1))?F:float)) (down 2000)"
+    pending = []
+    add_check = tok.add_check
+    def counting(checks, check):
+        add_check(checks, check)
+        pending.append(sum(1 for entry in checks if type(entry) is not list))
+    monkeypatch.setattr(tok, 'add_check', counting)
+    for evaluator in (tok.evaluate_tree, tok.evaluate_stack):
+        del pending[:]
+        ctx = ctxs.BaseContext(evaluator, tok.parse_type, math_literals())
+        assert is_type_with_binding(run(source, ctx), types.Float, 0)
+        assert pending and max(pending) <= 2
+
+def test_base_check():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    fact = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))"
+    checked = ctx.check(tok.parse(list(tok.tokenize(fact)), ctx)[0])
+    body = checked.children[3]
+    assert body.checked
+    then, otherwise = body.body.args[1:]
+    assert type(otherwise) == CheckedForm and type(otherwise.children[2]) == CheckedForm
+    assert type(body.body.args[0]) == CheckedForm
+    # untyped arguments are not proven, but neither are they errors.
+    def check(source):
+        return ctx.check(tok.parse(list(tok.tokenize(source)), ctx)[0]).children[3]
+    assert type(check("(def! f (x) (+ x 1))").body) == Form
+    assert not check("(def! g?F:float (x) x)").checked
+    assert check("(def! h (x) x?F:float)").body.annotation is not None
+    assert check("(def! h (x) (+ x 1)?F:float)").body.annotation is None
+    for bad in ['(+ 1 "two")', '(+ 1)', '(1 2)', '(+ 1 2)?F:string', '(def! g?F:string (x?F:float) (+ x 1))',
+                '(def! + (x) x)']:
+        expect_value_error(lambda: ctx.check(tok.parse(list(tok.tokenize(bad)), ctx)[0]))
+
+def test_checked_evaluation_skips_validation(monkeypatch):
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    fact = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))"
+    validations = []
+    real_validate = types.TypeTag.validate
+    def counting_validate(self, value):
+        validations.append(value)
+        return real_validate(self, value)
+    monkeypatch.setattr(types.TypeTag, "validate", counting_validate)
+    rv = run(fact + " (fact 5)", ctx, checked)
+    assert validations == []
+    assert is_type_with_binding(rv, types.Float, 120)
+    assert is_type_with_binding(run("(fact 5)", ctx, resolved), types.Float, 120)
+    assert len(validations) > 0
+    # code that isn't proven is still validated
+    run("(def! f (x) (fact x))", ctx, checked)
+    expect_value_error(lambda: run('(f "x")', ctx, checked))
+
+def test_special_forms_parse_each_site_once(monkeypatch):
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    def_form, if_form = ctx.special_forms['def!'], ctx.special_forms['if!']
+    assert ctx.literal('if!') is if_form and ctx.is_special_form(if_form)
+    parses = []
+    for form in (def_form, if_form):
+        real_parse = form.parse
+        def counting_parse(node, real_parse=real_parse):
+            parses.append(node)
+            return real_parse(node)
+        monkeypatch.setattr(form, 'parse', counting_parse)
+    run("(def! down (n) (if! n (down (- n 1)) n))", ctx, resolved)
+    assert is_type_with_binding(run("(down 100)", ctx, resolved), types.Float, 0)
+    assert len(parses) == 2
+    assert if_form.sites[id(parses[1])][1][1:] == parses[1].children[2:]
+    expect_value_error(lambda: run("(if! 1 2)", ctx))
+    monkeypatch.setattr(if_form, 'max_sites', 1)
+    run("(if! 1 2 3) (if! 0 2 3)", ctx)
+    assert len(if_form.sites) == 1
+
+def test_memoized_functions():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals(), memo_size=64)
+    fib = "(defmemo! fib (n) (if! (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))"
+    assert is_type_with_binding(run(fib + " (fib 60)", ctx, resolved), types.Float, 1548008755920)
+    info = ctx.memo.info()
+    assert info.misses == 61 and info.hits == 58 and info.size == 61
+    run("(fib 60)", ctx, resolved)
+    assert ctx.memo.info().hits == 59
+    # the least recently used results go first
+    small = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals(), memo_size=2)
+    run(fib + " (fib 1) (fib 2) (fib 3)", small)
+    assert len(small.memo.results) == 2
+    run("(fib 1)", small)
+    assert small.memo.info().misses == 5
+    # still typed and checkable
+    run('(defmemo! sq?F:float (x?F:float) (* x x))', ctx, checked)
+    expect_value_error(lambda: run('(sq "x")', ctx, checked))
+    assert is_type_with_binding(run('(sq 3)', ctx, checked), types.Float, 9)
+    ctx.memo.clear()
+    assert ctx.memo.info() == ctxs.MemoInfo(0, 0, 64, 0)
+
+def test_budget():
+    spin = "(def! spin (n) (spin (+ n 1))) (spin 0)"
+    for evaluator in (tok.evaluate_tree, tok.evaluate_stack):
+        ctx = ctxs.BaseContext(evaluator, tok.parse_type, math_literals())
+        ctx.budget = ctxs.Budget(max_steps=1000)
+        try:
+            run(spin, ctx, resolved)
+            assert False
+        except ctxs.BudgetExceeded as e:
+            assert e.resource == 'steps' and ctx.budget.steps == 1001
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    ctx.budget = ctxs.Budget(max_allocations=100)
+    try:
+        run("(def! down (n) (if! (< n 1) n (down (- n 1)))) (down 1000)", ctx, resolved)
+        assert False
+    except ctxs.BudgetExceeded as e:
+        assert e.resource == 'allocations' and e.limit == 100
+    # within the budget, the program runs as it would
+    ctx.budget = ctxs.Budget(max_steps=1000, max_allocations=1000)
+    assert is_type_with_binding(run("(down 10)", ctx, resolved), types.Float, 0)
+    assert ctx.budget.steps == 10 * 4 + 3 and ctx.budget.allocations == 11
+
+def test_type_table():
+    resolved = []
+    class CountingContext(ctxs.BaseContext):
+        def resolve_type(self, semantics, name, *args):
+            resolved.append(name)
+            return super().resolve_type(semantics, name, *args)
+    ctx = CountingContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    source = "(def! f?F:(-> ?F:float ?F:float) (g?F:(-> ?F:float ?F:float) x?F:float) g?F:(-> ?F:float ?F:float))"
+    tok.parse_program(list(tok.tokenize(source)), ctx)
+    # each distinct type once: float, and the function type over it
+    assert resolved == ['float', '->']
+    table = ctx.type_table
+    assert table.misses == 3 and table.hits > table.misses
+    # child contexts share the table
+    assert ctx.child({}).get_type(None, 'float') is types.Float.tag and len(resolved) == 2
+    table.invalidate()
+    assert ctx.get_type(None, 'float') is types.Float.tag and resolved[-1] == 'float'
+    assert table.generation == 1
+    expect_value_error(lambda: ctx.get_type(None, 'unknown'))
@@ -0,0 +1,69 @@
+import asyncio
+
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import bytecode as bc
+import cooperative
+
+from testing_utils import *
+
+LOOP = "(def! loop?F:float (n?F:float acc?F:float) (if! (< n 1) acc (loop (- n 1) (+ (note acc) n))))"
+
+def make_context(notes, name):
+    literals = math_literals()
+    def note(x):
+        notes.append(name)
+        return x
+    literals['note'] = types.wrap_py_fn(note, 'note', types.Float(), types.Float())
+    return ctxs.BaseContext(bc.evaluate, tok.parse_type, literals)
+
+def run_until_complete(coroutine):
+    # asyncio.run is 3.7+, and CI runs 3.6
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+def test_steps():
+    ctx = make_context([], 'a')
+    run(LOOP, ctx, checked, bc.evaluate)
+    node = ctx.check(tok.parse_program(list(tok.tokenize("(loop 10 0)")), ctx)[0])
+    evaluation = cooperative.steps(node, ctx, every=5)
+    pauses = 0
+    try:
+        while True:
+            next(evaluation)
+            pauses += 1
+    except StopIteration as done:
+        assert is_type_with_binding(done.value, types.Float, 55)
+    # 11 calls to loop and <, and 10 to each of note, + and -
+    assert pauses == 52 // 5
+
+def test_interleaved():
+    notes = []
+    async def main():
+        return await asyncio.gather(
+                cooperative.evaluate_source_async(LOOP + " (loop 100 0)", make_context(notes, 'a'), every=10),
+                cooperative.evaluate_source_async(LOOP + " (loop 100 0)", make_context(notes, 'b'), every=10))
+    assert run_until_complete(main()) == [5050, 5050]
+    # neither ran to the end before the other started
+    assert {'a', 'b'} <= set(notes[:len(notes) // 4])
+
+def test_cancelled():
+    notes = []
+    spin = "(def! spin (n) (spin (note (+ n 1)))) (spin 0)"
+    async def main():
+        spinning = cooperative.evaluate_source_async(spin, make_context(notes, 'spin'), every=100)
+        try:
+            await asyncio.wait_for(spinning, 0.1)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            assert False
+        count = len(notes)
+        await asyncio.sleep(0.01)
+        return count
+    count = run_until_complete(main())
+    assert count > 0 and len(notes) == count
@@ -0,0 +1,68 @@
+"""
+Building and updating persistent maps: the HAMT against copying a dict on every
+update (like `lexical_vars.copy()` did). Run it directly: `python tests/hamt_bench.py [n [updates]]`.
+
+Copying is quadratic to build with, so the dict baseline is built up to a
+smaller size and its time per insert reported alongside.
+"""
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from hamt import HAMT
+
+def timed(fn, *args):
+    # like timeit, without the collector scanning the big maps as they're made
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        rv = fn(*args)
+        return rv, time.perf_counter() - start
+    finally:
+        gc.enable()
+
+def build_hamt(n):
+    entries = HAMT()
+    for i in range(n):
+        entries = entries.assoc(i, i)
+    return entries
+
+def build_copied(n):
+    entries = dict()
+    for i in range(n):
+        entries = dict(entries)
+        entries[i] = i
+    return entries
+
+def update_hamt(entries, updates):
+    for i in range(updates):
+        entries = entries.assoc(i * 7919 % len(entries), -i)
+    return entries
+
+def update_copied(entries, updates):
+    for i in range(updates):
+        entries = dict(entries)
+        entries[i * 7919 % len(entries)] = -i
+    return entries
+
+def main(n=10 ** 6, updates=1000):
+    copied_n = min(n, 2 * 10 ** 4)
+    entries, hamt_build = timed(build_hamt, n)
+    _, copied_build = timed(build_copied, copied_n)
+    print("build {} entries:".format(n))
+    print("  hamt:        {:8.3f}s  {:8.2f}us/insert".format(hamt_build, hamt_build / n * 1e6))
+    print("  copied dict: {:8.3f}s  {:8.2f}us/insert (to {} entries only)".format(
+        copied_build, copied_build / copied_n * 1e6, copied_n))
+    full = dict(entries.items())
+    _, hamt_update = timed(update_hamt, entries, updates)
+    _, copied_update = timed(update_copied, full, updates)
+    print("{} updates of {} entries:".format(updates, n))
+    print("  hamt:        {:8.3f}s  {:8.2f}us/update".format(hamt_update, hamt_update / updates * 1e6))
+    print("  copied dict: {:8.3f}s  {:8.2f}us/update".format(copied_update, copied_update / updates * 1e6))
+    print("speedup on updates: {:.0f}x".format(copied_update / hamt_update))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,116 @@
+import random
+
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import hashmaps
+from hamt import HAMT, BitmapNode, CollisionNode
+
+from testing_utils import *
+
+class Colliding:
+    """ A key that hashes like every other. """
+    def __init__(self, name):
+        self.name = name
+    def __hash__(self):
+        return 42
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and self.name == other.name
+
+def test_hamt_matches_dict():
+    rng = random.Random(7)
+    expected = dict()
+    entries = HAMT()
+    versions = []
+    for _ in range(5000):
+        key = rng.randrange(2000)
+        if rng.random() < 0.3:
+            expected.pop(key, None)
+            entries = entries.dissoc(key)
+        else:
+            expected[key] = rng.random()
+            entries = entries.assoc(key, expected[key])
+        versions.append((dict(expected), entries))
+    assert dict(entries.items()) == expected and len(entries) == len(expected)
+    # the old versions are untouched
+    for old, version in versions[::250]:
+        assert dict(version.items()) == old
+    assert HAMT(expected) == entries
+    for key in expected:
+        entries = entries.dissoc(key)
+    assert len(entries) == 0 and entries.root.array == ()
+
+def test_hamt_sharing():
+    entries = HAMT((i, i) for i in range(10000))
+    updated = entries.assoc(5, 'five')
+    assert entries[5] == 5 and updated[5] == 'five'
+    shared = [a is b for a, b in zip(entries.root.array, updated.root.array)]
+    assert shared.count(False) == 1
+    assert entries.assoc(5, 5) is entries and entries.dissoc(-1) is entries
+    expect_key_error = lambda: entries[-1]
+    try:
+        expect_key_error()
+        assert False
+    except KeyError:
+        pass
+
+def test_hamt_collisions():
+    a, b, c = Colliding('a'), Colliding('b'), Colliding('c')
+    # an int key hashes the same on every run, into another slot (42 & 31 != 3)
+    entries = HAMT([(a, 1), (b, 2), (3, 3)])
+    assert entries[a] == 1 and entries[b] == 2 and entries[3] == 3
+    assert any(type(node) is CollisionNode for node in entries.root.array)
+    entries = entries.assoc(c, 4).assoc(a, 5)
+    assert len(entries) == 4 and entries[a] == 5 and c in entries
+    entries = entries.dissoc(b).dissoc(c)
+    assert len(entries) == 2 and entries[a] == 5 and b not in entries
+    assert not any(type(node) is CollisionNode for node in entries.root.array)
+
+def test_hashmap_type():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, dict())
+    typ = ctx.get_type(None, 'hashmap', types.String.tag, types.Float.tag)
+    prices = typ.bind({'a': 1.0, 'b': 2.5})
+    assert types.tag_of(prices) is typ and typ.validate(prices) and len(prices) == 2
+    expect_value_error(lambda: typ.bind({'a': 'b'}))
+    expect_value_error(lambda: ctx.get_type(None, 'hashmap', types.String.tag))
+    tokens = list(tok.tokenize("?F:(hashmap ?F:string ?F:float)"))
+    assert tok.parse_type(tokens, ctx, 0)[1] is typ
+
+def test_hashmap_builtins():
+    literals = math_literals()
+    literals.update(hashmaps.hashmap_literals())
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
+    run('(def! m?F:(hashmap ?F:any ?F:any) () (assoc (assoc (hashmap) "pi" 3.14) 1 "one"))', ctx, checked)
+    assert run('(lookup (m) "pi")', ctx, checked) == 3.14 and run('(lookup (m) 1)', ctx, checked) == "one"
+    assert run('(count (m))', ctx, checked) == 2 and run('(count (dissoc (m) 1))', ctx, checked) == 1
+    assert run('(contains (m) "pi")', ctx, checked) is True and run('(contains (dissoc (m) "pi") "pi")', ctx, checked) is False
+    expect_value_error(lambda: run('(lookup (m) "e")', ctx, checked))
+    expect_value_error(lambda: run('(assoc (m) + 1)', ctx, checked))
+    expect_value_error(lambda: run('(count 1)', ctx, checked))
+
+def test_typed_hashmap_builtins():
+    literals = math_literals()
+    literals.update(hashmaps.hashmap_literals())
+    typ = types.TypeTag('hashmap', [types.String.tag, types.Float.tag])
+    literals['prices'] = typ.bind({'a': 1.0, 'b': 2.5})
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
+    run('(def! more?F:(hashmap ?F:string ?F:float) () (assoc prices "c" 4))', ctx, checked)
+    assert run('(lookup (more) "c")', ctx, checked) == 4 and run('(lookup prices "b")', ctx, checked) == 2.5
+    assert run('(count (dissoc (more) "a"))', ctx, checked) == 2 and run('(contains prices "c")', ctx, checked) is False
+    assert types.tag_of(run('(dissoc prices "a")', ctx, checked)) is typ
+    expect_value_error(lambda: run('(assoc prices "d" "not a float")', ctx, checked))
+    expect_value_error(lambda: run('(assoc prices 1 2)', ctx, checked))
+
+def test_typed_maps_from_programs():
+    literals = math_literals()
+    literals.update(hashmaps.hashmap_literals())
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
+    typ = types.TypeTag('hashmap', [types.String.tag, types.Float.tag])
+    assert typ.validate(run('(assoc (hashmap) "pi" 3.14)?F:(hashmap ?F:string ?F:float)', ctx, checked))
+    assert typ.validate(run('(hashmap)?F:(hashmap ?F:string ?F:float)', ctx, checked))
+    expect_value_error(lambda: run('(assoc (hashmap) 1 3.14)?F:(hashmap ?F:string ?F:float)', ctx, checked))
+    run('(def! prices?F:(hashmap ?F:string ?F:float) () (assoc (hashmap) "a" 1))', ctx, checked)
+    run('(def! price?F:float (m?F:(hashmap ?F:string ?F:float) k?F:string) (lookup m k))', ctx, checked)
+    assert run('(price (prices) "a")', ctx, checked) == 1 and run('(price (assoc (hashmap) "b" 2) "b")', ctx, checked) == 2
+    expect_value_error(lambda: run('(price (assoc (hashmap) "b" "c") "b")', ctx, checked))
+    expect_value_error(lambda: run('(def! bad?F:(hashmap ?F:string ?F:float) () 1)', ctx, checked))
@@ -0,0 +1,105 @@
+import operator
+
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import incremental
+
+from testing_utils import *
+
+def make_session(check=False):
+    return incremental.Session(ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals()), check)
+
+def values(results):
+    return [r.value if r.error is None else r.error for r in results]
+
+def update(session, source):
+    session.update(source)
+    return session.results()
+
+def test_split_forms():
+    source = '(def! f?F:float (x) (+ x ")("))\n 5 (f 2)?F:float  x ?F:(-> ?F:float ?F:float) (g'
+    assert [source[start:end] for start, end in tok.split_forms(source)] == [
+        '(def! f?F:float (x) (+ x ")("))', '5', '(f 2)?F:float', 'x ?F:(-> ?F:float ?F:float)', '(g']
+    assert tok.split_forms('  \n') == []
+
+SOURCE = """
+(def! double (x) (* x 2))
+(def! quad (x) (double (double x)))
+(def! inc (x) (+ x 1))
+(quad 3)
+(inc 3)
+"""
+
+def test_only_changes_evaluated():
+    session = make_session()
+    assert values(update(session, SOURCE))[3:] == [12, 4]
+    assert session.parsed == 5 and session.evaluated == 5
+    assert values(update(session, SOURCE))[3:] == [12, 4]
+    assert session.parsed == 0 and session.evaluated == 0
+    # quad and (quad 3) depend on double, inc and (inc 3) don't
+    edited = SOURCE.replace('(* x 2)', '(* x 3)')
+    assert values(update(session, edited))[3:] == [27, 4]
+    assert session.parsed == 1 and session.evaluated == 3
+    # an inserted expression moves the rest but doesn't change them
+    evaluated = session.update("(inc 10)\n" + edited)
+    assert values(evaluated) == [11] and evaluated[0].index == 0
+    assert session.parsed == 1 and session.evaluated == 1
+    assert values(update(session, "(inc 10)\n" + edited + "  "))[4:] == [27, 4]
+    assert session.parsed == 0 and session.evaluated == 0
+    # an annotation added to an expression is part of it
+    results = update(session, "(inc 10) ?F:float\n" + edited)
+    assert results[0].span == (0, 17) and session.parsed == 1
+
+def test_removed_definitions():
+    session = make_session()
+    update(session, SOURCE)
+    results = update(session, SOURCE.replace('(def! inc (x) (+ x 1))', ''))
+    assert values(results)[-1] == 'ValueError: inc is not bound'
+    # defining a builtin shadows it until the definition is gone
+    update(session, "(def! + (x y) (* x y)) (+ 2 3)")
+    assert values(update(session, "(+ 2 3)")) == [5]
+
+def test_mutual_recursion():
+    session = make_session()
+    source = """
+(def! even (n) (if! (< n 1) 1 (odd (- n 1))))
+(def! odd (n) (if! (< n 1) 0 (even (- n 1))))
+(even 3)
+"""
+    assert values(update(session, source))[-1] == 0
+    # (even 3) calls odd through even, so it is evaluated again
+    assert values(update(session, source.replace('0 (even', '5 (even')))[-1] == 5
+    assert session.evaluated == 3
+
+def test_errors_and_types():
+    session = make_session(check=True)
+    results = update(session, "(def! f?F:float (x?F:float) x) (f 1) (f")
+    assert values(results)[1] == 1 and results[2].error.startswith('ValueError')
+    # retyping a function is fine when the old one is gone
+    results = update(session, '(def! f?S:string (x?S:string) x) (f "a")')
+    assert values(results)[1] == 'a'
+
+def test_any_error_is_recorded():
+    session = make_session()
+    session.context.lexical_vars['/'] = types.wrap_py_fn(operator.truediv, '/',
+            types.Float(), types.Float(), types.Float())
+    source = '(def! f (x) (/ 1 x)) (f 0) (f 2)'
+    results = update(session, source)
+    assert results[1].error.startswith('ZeroDivisionError') and results[2].value == 0.5
+    results = update(session, source.replace('(f 0)', '(f 4)'))
+    assert values(results)[1:] == [0.25, 0.5]
+
+def test_spans_follow_edits():
+    import random
+    rng = random.Random(7)
+    session = make_session()
+    source = SOURCE * 3
+    pieces = ['(', ')', ' ', '?F:float', '"a)"', 'x', '(inc 1)', '\n']
+    for _ in range(200):
+        start = rng.randrange(len(source) + 1)
+        end = min(len(source), start + rng.randrange(4))
+        source = source[:start] + rng.choice(pieces) + source[end:]
+        session.update(source)
+        assert session.spans == tok.split_forms(source)
+        assert [form.text for form in session.forms] == [source[s:e] for s, e in session.spans]
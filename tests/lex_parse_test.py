@@ -1,4 +1,5 @@
 import tokenizer as tok
+from syntax_tree import Atom, Form
 
 from functools import reduce
 import pytest
@@ -42,3 +43,71 @@ def test_types():
     pt = PlusTimesCtx()
     assert tok.evaluate(list(tok.tokenize("(+ 1 1)?F:int")), pt)[0] == 2
     assert tok.evaluate(list(tok.tokenize("(+?F:(fn ?F:int ?F:int) 1 1)?F:int")), pt)[0] == 2
+
+def test_parse():
+    pt = PlusTimesCtx()
+    tree, index = tok.parse(list(tok.tokenize("(+ 1 (* 2 3)?F:int)")), pt)
+    assert index == 13
+    assert tree == Form((Atom('+'), Atom('1'), Form((Atom('*'), Atom('2'), Atom('3')), ('F', 'int'))))
+    assert tok.evaluate_tree(tree, pt) == 7
+    assert tok.parse_program(list(tok.tokenize("1 (+ 1 1) 2?F:int")), pt)\
+            == (Atom('1'), Form((Atom('+'), Atom('1'), Atom('1'))), Atom('2', ('F', 'int')))
+    for bad in ["(+ 1", ")", "?F:int", "1?F"]:
+        try:
+            tok.parse(list(tok.tokenize(bad)), pt)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+def test_scan():
+    source = '(def! greet (x) "hello there (you)")?F:string'
+    tokens = list(tok.scan(source))
+    assert [t for t, _ in tokens] == ['(', 'def!', 'greet', '(', 'x', ')', '"hello there (you)"', ')',
+                                      '?', 'F', ':', 'string']
+    assert all(source.startswith(t, offset) for t, offset in tokens)
+    # every way of splitting the source into chunks gives the same tokens
+    for size in range(1, len(source)):
+        chunks = [source[i:i + size] for i in range(0, len(source), size)]
+        assert list(tok.scan(chunks)) == tokens
+        assert list(tok.tokenize(chunks)) == [t for t, _ in tokens]
+    assert list(tok.tokenize(iter(source))) == [t for t, _ in tokens]
+    try:
+        list(tok.tokenize('(foo "bar'))
+    except ValueError:
+        pass
+    else:
+        assert False
+
+def tokens_or_error(tokens):
+    try:
+        return list(tokens)
+    except ValueError:
+        return ValueError
+
+def test_tokenizers_agree():
+    import random
+    rng = random.Random(2)
+    for _ in range(2000):
+        source = ''.join(rng.choice('()?:" \nab1.') for _ in range(rng.randrange(30)))
+        cuts = sorted(rng.sample(range(len(source) + 1), rng.randrange(min(len(source), 5) + 1)))
+        chunks = [source[i:j] for i, j in zip([0] + cuts, cuts + [len(source)])]
+        scanned = tokens_or_error(tok.scan(chunks))
+        if scanned is not ValueError:
+            assert all(source.startswith(t, offset) for t, offset in scanned)
+            scanned = [t for t, _ in scanned]
+        assert tokens_or_error(tok.tokenize(chunks)) == scanned == tokens_or_error(tok.tokenize(source))
+
+def test_scan_files(tmp_path):
+    import mmap
+    path = tmp_path / 'prog.sl'
+    path.write_text("(+ 121 1 (* 2 3))\n" * 1000 + '"é"')
+    expected = ['(', '+', '121', '1', '(', '*', '2', '3', ')', ')'] * 1000 + ['"é"']
+    with open(path) as f:
+        assert list(tok.tokenize(f)) == expected
+    with open(path, 'rb') as f:
+        assert list(tok.tokenize(f)) == expected
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            assert list(tok.tokenize(m)) == expected
+    with open(path, 'rb') as f:
+        assert ''.join(tok.read_chunks(f, 3)) == path.read_text()
@@ -0,0 +1,79 @@
+from array import array
+
+import pytest
+
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import lists
+
+from testing_utils import *
+
+def list_context():
+    literals = math_literals()
+    literals.update(lists.list_literals())
+    return ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, literals)
+
+def test_list_type():
+    ctx = list_context()
+    floats = lists.floats([1, 2.5, True])
+    assert list(floats) == [1.0, 2.5, 1.0] and len(floats) == 3
+    assert types.tag_of(floats) is lists.FLOAT_LIST is ctx.get_type(None, 'list', types.Float.tag)
+    assert lists.FLOAT_LIST.validate(floats) and not types.Float.tag.validate(floats)
+    expect_value_error(lambda: lists.floats([1, "two"]))
+    bound = lists.FLOAT_LIST.bind(array('d', [1, 2]))
+    assert list(bound) == [1, 2]
+    strings = types.TypeTag('list', [types.String.tag]).bind(["a", "b"])
+    assert list(strings) == ["a", "b"] and not lists.FLOAT_LIST.validate(strings)
+    expect_value_error(lambda: types.List(types.String.tag, ["a", 1.0]))
+    expect_value_error(lambda: ctx.get_type(None, 'list'))
+    tokens = list(tok.tokenize("?F:(list ?F:float)"))
+    assert tok.parse_type(tokens, ctx, 0)[1] is lists.FLOAT_LIST
+
+def test_list_builtins():
+    ctx = list_context()
+    assert list(run("(range 4)", ctx, checked)) == [0, 1, 2, 3]
+    assert list(run("(.+ (range 3) (fill 3 0.5))", ctx, checked)) == [0.5, 1.5, 2.5]
+    assert list(run("(.- (range 3) (range 3))", ctx, checked)) == [0, 0, 0]
+    assert list(run("(./ (fill 2 1) (fill 2 4))", ctx, checked)) == [0.25, 0.25]
+    assert list(run("(scale (offset (range 3) 1) 2)", ctx, checked)) == [2, 4, 6]
+    assert list(run("(append (range 2) 7)", ctx, checked)) == [0, 1, 7]
+    assert run("(sum (.* (range 4) (fill 4 2.5)))", ctx, checked) == 15
+    assert run("(dot (range 3) (range 3))", ctx, checked) == 5
+    assert run("(length (range 5))", ctx, checked) == 5 and run("(at (range 5) 3)", ctx, checked) == 3
+    expect_value_error(lambda: run("(at (range 5) 5)", ctx, checked))
+    expect_value_error(lambda: run("(.+ (range 3) (range 2))", ctx, checked))
+    expect_value_error(lambda: run("(sum 3)", ctx, checked))
+    run("(def! sq?F:float (x?F:float) (* x x))", ctx, checked)
+    assert list(run("(map sq (range 4))", ctx, checked)) == [0, 1, 4, 9]
+    assert run("(fold + 10 (range 4))", ctx, checked) == 16
+    run("(def! squares?F:(list ?F:float) (n?F:float) (map sq (range n)))", ctx, checked)
+    assert run("(sum (squares 4))", ctx, checked) == 14
+    expect_value_error(lambda: run('(def! f?F:float (xs?F:(list ?F:float)) xs)', ctx, checked))
+
+def test_map_and_fold_any_function():
+    ctx = list_context()
+    run("(def! dbl (x) (* x 2)) (def! add (acc x) (+ acc x))", ctx, checked)
+    assert list(run("(map dbl (range 4))", ctx, checked)) == [0, 2, 4, 6]
+    assert run("(fold add 10 (range 4))", ctx, checked) == 16
+    run('(def! name (x) "a") (def! sq?F:float (x?F:float) (* x x))', ctx, checked)
+    expect_value_error(lambda: run("(map name (range 2))", ctx, checked))
+    expect_value_error(lambda: run("(map add (range 2))", ctx, checked))
+    expect_value_error(lambda: run("(map 1 (range 2))", ctx, checked))
+    expect_value_error(lambda: run("(fold sq 0 (range 2))", ctx, checked))
+
+def test_lists_from_iterators():
+    # the same inputs make lists with numpy or without
+    assert list(lists.floats(x / 2 for x in range(3))) == [0, 0.5, 1]
+    assert list(lists.floats(iter([]))) == []
+    expect_value_error(lambda: lists.floats(x for x in ["a", "b"]))
+
+def test_numpy_elements_are_floats():
+    pytest.importorskip('numpy')
+    ctx = list_context()
+    # unchecked, so the builtins the bodies call validate the elements
+    run("(def! sq?F:float (x?F:float) (* x x))", ctx, resolved)
+    assert list(run("(map sq (range 4))", ctx, resolved)) == [0, 1, 4, 9]
+    run("(def! add?F:float (acc?F:float x?F:float) (+ acc x))", ctx, resolved)
+    assert is_type_with_binding(run("(fold add 10 (range 4))", ctx, resolved), types.Float, 16)
+    assert type(lists.elements(lists.floats([1, 2]))[0]) is float
@@ -0,0 +1,56 @@
+import pytest
+
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import loader
+
+from testing_utils import *
+
+def make_context():
+    return ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, math_literals())
+
+FACT = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))\n"
+DEFS = ''.join("(def! f{0}?F:float (x?F:float) (+ x {0}))\n".format(i) for i in range(50))
+
+def write(tmp_path, name, source):
+    path = tmp_path / name
+    path.write_text(source)
+    return str(path)
+
+def test_chunk_source():
+    chunks = loader.chunk_source(DEFS + "  \n", 100)
+    assert ''.join(chunks) == DEFS + "  \n" and len(chunks) > 1
+    assert all(len(tok.parse_program(list(tok.tokenize(chunk)), make_context())) > 0 for chunk in chunks)
+    assert loader.chunk_source("  ", 100) == []
+
+def test_load_files(tmp_path):
+    paths = [write(tmp_path, 'fact.sem', FACT + "(fact 5)"), write(tmp_path, 'defs.sem', DEFS + "(f49 1)"),
+            write(tmp_path, 'empty.sem', ""), write(tmp_path, 'uses_fact.sem', "(fact 3)")]
+    for workers in (0, 2):
+        with pytest.raises(ValueError, match='fact is not bound'):
+            loader.load_files(paths, make_context, workers=workers, chunk_size=200)
+        loaded, timings = loader.load_files(paths[:3], make_context, workers=workers, chunk_size=200)
+        assert [l.path for l in loaded] == paths[:3]
+        assert is_type_with_binding(loaded[0].value, types.Float, 120)
+        assert is_type_with_binding(loaded[1].value, types.Float, 50) and len(loaded[1].nodes) == 51
+        assert loaded[2].nodes == [] and loaded[2].value is None
+        assert all(seconds >= 0 for seconds in timings)
+        # each file is a module of its own
+        assert 'fact' in loaded[0].context.lexical_vars and 'f0' not in loaded[0].context.lexical_vars
+        assert 'f0' in loaded[1].context.lexical_vars and 'fact' not in loaded[1].context.lexical_vars
+
+def test_load_file(tmp_path):
+    ctx = make_context()
+    loaded, _ = loader.load_file(write(tmp_path, 'fact.sem', FACT), make_context, context=ctx)
+    assert loaded.context is ctx and 'fact' in ctx.lexical_vars
+    loaded, _ = loader.load_file(write(tmp_path, 'uses_fact.sem', "(fact 3)"), make_context, context=ctx)
+    assert is_type_with_binding(loaded.value, types.Float, 6)
+
+def test_load_file_errors(tmp_path):
+    path = write(tmp_path, 'bad.sem', FACT + "(fact")
+    expect_value_error(lambda: loader.load_file(path, make_context, workers=2, chunk_size=10))
+    path = write(tmp_path, 'typed.sem', FACT + '(fact "a")')
+    loaded, _ = loader.load_file(write(tmp_path, 'ok.sem', FACT), make_context, check=True)
+    assert len(loaded.nodes) == 1
+    expect_value_error(lambda: loader.load_file(path, make_context, workers=0, check=True))
@@ -0,0 +1,84 @@
+import tokenizer as tok
+import context as ctxs
+import sem_lang_types as types
+import bytecode as bc
+import optimize
+
+from testing_utils import *
+from syntax_tree import Const, Form
+
+def make_context(evaluator=tok.evaluate_tree):
+    return ctxs.BaseContext(evaluator, tok.parse_type, math_literals())
+
+def optimized(source, ctx, check=False, enabled=True):
+    nodes = [ctx.check(node) if check else ctx.resolve(node)
+            for node in tok.parse_program(list(tok.tokenize(source)), ctx)]
+    return optimize.optimize_program(nodes, ctx, enabled)
+
+def evaluate(source, check=False, evaluator=tok.evaluate_tree):
+    ctx = make_context(evaluator)
+    nodes, report = optimized(source, ctx, check)
+    return evaluate_all(nodes, ctx, evaluator), nodes, report
+
+def test_folding():
+    rv, nodes, report = evaluate("(+ 1 (* 2 3))")
+    assert nodes == [Const(7.0)] and rv == 7
+    assert report.folded == [('*', 6.0), ('+', 7.0)]
+    assert str(report) == '2 calls folded, 0 branches pruned, 0 calls inlined'
+    # a builtin the program binds isn't folded
+    rv, nodes, report = evaluate("(defmemo! + (x y) (- x y)) (+ 2 3)")
+    assert rv == -1 and not report.folded
+    rv, nodes, report = evaluate("(def! + (x y) (- x y)) (+ 2 3)")
+    assert rv == -1 and report.inlined == ['+'] and report.folded == [('-', -1.0)]
+    # nor are calls that fail
+    ctx = make_context()
+    nodes, report = optimized('(+ 1 "a")', ctx)
+    assert isinstance(nodes[0], Form) and not report.folded
+    expect_value_error(lambda: ctx.eval(nodes[0]))
+
+def test_pruning():
+    rv, nodes, report = evaluate('(if! (< 1 2) (+ 1 1) "no")')
+    assert nodes == [Const(2.0)] and report.pruned == 1
+    rv, nodes, report = evaluate("(def! f (x) (if! (< 2 1) (f x) x)) (f 4)")
+    assert rv == 4 and report.pruned == 1 and report.inlined == ['f']
+
+FACT = "(def! fact?F:float (n?F:float) (if! (< n 1) 1 (* n (fact (- n 1)))))"
+PROGRAM = FACT + """
+(def! sq?F:float (x?F:float) (* x x))
+(def! hyp (a b) (+ (sq a) (sq b)))
+(hyp 3 4)
+(sq (fact 3))
+"""
+
+def test_inlining():
+    for check in (False, True):
+        for evaluator in (tok.evaluate_tree, bc.evaluate):
+            rv, nodes, report = evaluate(PROGRAM, check, evaluator)
+            # recursive functions and calls with arguments that aren't simple aren't inlined
+            assert report.inlined == ['sq', 'sq', 'hyp'] and rv == 36
+            assert nodes[3] == Const(25.0, nodes[3].annotation)
+    # the types of the arguments are still checked
+    ctx = make_context()
+    nodes, report = optimized('(def! sq?F:float (x?F:float) (* x x)) (def! f (y) (sq y)) (f "a")', ctx)
+    ctx.eval(nodes[0])
+    ctx.eval(nodes[1])
+    assert report.inlined == ['sq']
+    expect_value_error(lambda: ctx.eval(nodes[2]))
+
+def test_only_top_level_definitions_inlined():
+    # a def! that may not run isn't inlined
+    ctx = make_context()
+    nodes, report = optimized("(if! 0 (def! h (x) 1) 0) (h 2)", ctx)
+    assert not report.inlined
+    ctx.eval(nodes[0])
+    expect_value_error(lambda: ctx.eval(nodes[1]))
+    # nor is a malformed one, which is left to fail when evaluated
+    ctx = make_context()
+    nodes, report = optimized("(def! (f) (x) x)", ctx)
+    assert not report.inlined
+    expect_value_error(lambda: ctx.eval(nodes[0]))
+
+def test_disabled():
+    ctx = make_context()
+    nodes, report = optimized("(+ 1 2)", ctx, enabled=False)
+    assert isinstance(nodes[0], Form) and str(report) == '0 calls folded, 0 branches pruned, 0 calls inlined'
@@ -0,0 +1,42 @@
+import tokenizer as tok
+import sem_lang_types as types
+import profiling
+
+from testing_utils import *
+
+FIB = "(def! fib?F:float (n?F:float) (if! (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))"
+
+def test_profile_counts():
+    ctx = profiling.ProfilingContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    assert is_type_with_binding(run(FIB + " (fib 10)?F:float", ctx, resolved), types.Float, 55)
+    profile = ctx.profile
+    assert profile.calls['fib'] == 177 and profile.calls['<'] == 177
+    assert profile.special_forms == {'def!': 1, 'if!': 177}
+    # the argument of each call to fib and the annotation
+    assert profile.type_checks[types.Float.tag] > 177
+    assert profile.time['fib'] >= profile.time['+'] > 0
+    assert profile.report().splitlines()[1].split()[2] == 'fib'
+
+def test_profile_sampling():
+    ctx = profiling.ProfilingContext(tok.evaluate_tree, tok.parse_type, math_literals())
+    run(FIB, ctx, resolved)
+    with ctx.profile.sampling(0.0005) as profile:
+        run("(fib 17)", ctx, resolved)
+    assert profile.samples
+    for line in profile.collapsed().splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert stack.split(';')[0] == 'fib' and int(count) > 0
+    assert not profile.stack
+
+def test_profile_tail_calls():
+    DOWN = "(def! down (n) (if! (< n 1) 0 (down (- n 1))))"
+    for evaluator in (tok.evaluate_tree, tok.evaluate_stack):
+        ctx = profiling.ProfilingContext(evaluator, tok.parse_type, math_literals())
+        run(DOWN, ctx, resolved)
+        # as deep as it goes unprofiled, without taking stack
+        assert run("(down 5000)", ctx, resolved) == 0
+        assert ctx.profile.calls['down'] == 5001 and ctx.profile.time['down'] > 0
+        assert not ctx.profile.stack
+        # a failed evaluation leaves no calls behind
+        expect_value_error(lambda: run('(down "a")', ctx, resolved))
+        assert not ctx.profile.stack and not ctx.profile.starts
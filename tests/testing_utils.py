@@ -1,3 +1,5 @@
+from arithmetic import math_literals
+
 def expect_value_error(fn):
     try:
         fn()
@@ -7,4 +9,41 @@ def expect_value_error(fn):
         assert False
 
 def is_type_with_binding(value, typ, binding):
-    return value == typ() and value.binding == binding
+    """
+    Whether the evaluated value is of the type with the binding, whether
+    it is boxed or not.
+    """
+    import sem_lang_types as types
+    if isinstance(value, types.Type):
+        return value == typ() and value.binding == binding
+    return typ.tag.validate(value) and value == binding
+
+def resolved(ctx, node):
+    return ctx.resolve(node)
+
+def checked(ctx, node):
+    return ctx.check(node)
+
+def evaluate_all(nodes, ctx, evaluator=None):
+    """
+    Evaluates the trees in the context in order (with `tokenizer.evaluate_tree`
+    unless given another evaluator) and gets the value of the last of them.
+    """
+    import tokenizer as tok
+    evaluator = evaluator or tok.evaluate_tree
+    rv = None
+    for node in nodes:
+        rv = evaluator(node, ctx)
+    return rv
+
+def run(source, ctx, prepare=None, evaluator=None):
+    """
+    Parses the source in the context and evaluates its expressions (see
+    `evaluate_all`), each prepared by prepare(ctx, node) first if given (like
+    `resolved` or `checked`) after the ones before it are evaluated.
+    """
+    import tokenizer as tok
+    nodes = tok.parse_program(list(tok.tokenize(source)), ctx)
+    if prepare is not None:
+        nodes = (prepare(ctx, node) for node in nodes)
+    return evaluate_all(nodes, ctx, evaluator)
@@ -0,0 +1,55 @@
+"""
+Throughput of the tokenizer against the old character at a time generator
+on multi-megabyte sources. Run it directly: `python tests/tokenize_bench.py [MB]`.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tokenizer as tok
+
+def char_tokenize(char_iter):
+    """ The tokenizer as it was: concatenating a character at a time. """
+    def is_delim(char):
+        return char.isspace() or char in ['(', ')', '?', ':']
+
+    acc = ''
+    for char in char_iter:
+        if is_delim(char):
+            if acc != '':
+                yield acc
+            acc = ''
+            if not char.isspace():
+                yield char
+        else:
+            acc += char
+    if acc != '':
+        yield acc
+
+def make_source(megabytes):
+    form = "(def! some-rather-long-identifier?F:float (x?F:float y) (if! (< x 1) 1 (* x (+ y 3.14159))))\n"
+    return form * (megabytes * (1 << 20) // len(form) + 1)
+
+def throughput(tokenizer, source):
+    start = time.perf_counter()
+    count = sum(1 for _ in tokenizer(source))
+    elapsed = time.perf_counter() - start
+    return count, len(source) / elapsed / (1 << 20)
+
+def main(megabytes=4):
+    source = make_source(megabytes)
+    old_count, old_rate = throughput(char_tokenize, source)
+    new_count, new_rate = throughput(tok.tokenize, source)
+    chunked_count, chunked_rate = throughput(
+            lambda s: tok.tokenize(s[i:i + tok.CHUNK_SIZE] for i in range(0, len(s), tok.CHUNK_SIZE)), source)
+    assert old_count == new_count == chunked_count
+    print("{} MB, {} tokens".format(megabytes, new_count))
+    print("character at a time: {:8.2f} MB/s".format(old_rate))
+    print("scanner (one str):   {:8.2f} MB/s".format(new_rate))
+    print("scanner (chunked):   {:8.2f} MB/s".format(chunked_rate))
+    print("speedup: {:.1f}x".format(new_rate / old_rate))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -21,3 +21,44 @@ def test_validation():
     assert types.Bool().validate_py(True)
     assert types.Bool().validate_py(0.5)
     assert types.Type().validate_py("absolutely anything")
+
+def test_tags_are_interned():
+    import pickle
+    fn = types.TypeTag('->', (types.Float.tag, types.String.tag))
+    assert types.TypeTag('->', (types.Float(), types.String())) is fn
+    assert types.Function((types.Float(), types.String()), None).tag is fn
+    assert types.TypeTag('->', (types.String.tag, types.Float.tag)) is not fn
+    assert pickle.loads(pickle.dumps(fn)) is fn
+    assert {fn: 1}[types.TypeTag('->', (types.Float.tag, types.String.tag))] == 1
+    assert not hasattr(fn, '__dict__')
+    assert types.Float.tag == types.Float() and types.Float.tag != types.String()
+    assert repr(fn) == '(-> float string)'
+
+def test_tag_validation():
+    assert types.Float.tag.validate(types.Float(binding=1))
+    assert types.Float.tag.validate(0.5)
+    assert not types.Float.tag.validate(types.String(binding='0.5'))
+    assert types.ANY.validate(types.String(binding='0.5'))
+    assert is_type_with_binding(types.String.tag.bind('hi'), types.String, 'hi')
+
+def test_unboxed_values():
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, {'x': types.Float('x', 2)})
+    assert type(ctx.literal('1.5')) is float and type(ctx.literal('"s"')) is str
+    assert type(ctx.literal('x')) is float
+    assert types.tag_of(1.5) is types.Float.tag and types.tag_of(True) is types.Bool.tag
+    assert types.tag_of(types.Float(binding=1)) is types.Float.tag
+    add = types.wrap_py_fn(lambda x, y: x + y, '+', types.Float(), types.Float(), types.Float())
+    assert add(1.0, 2.0) == 3.0 and type(add(1.0, 2.0)) is float
+    expect_value_error(lambda: add(1.0, '2'))
+    assert not hasattr(types.Float(binding=1), '__dict__')
+
+def test_host_numbers_are_floats():
+    assert types.tag_of(1) is types.Float.tag and types.Float.tag.validate(1)
+    assert types.tag_of(None) is types.ANY and not types.Float.tag.validate('1')
+    length = types.Function((types.String(), types.Float()), len, 'length')
+    assert length('abc') == 3
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, {'n': 3})
+    node = tok.parse_program(list(tok.tokenize('n?F:float')), ctx)[0]
+    assert tok.evaluate_tree(ctx.resolve(node), ctx) == 3
+    numpy = pytest.importorskip('numpy')
+    assert types.Float.tag.validate(numpy.float64(0.5)) and types.Float.tag.validate(numpy.int64(2))
@@ -0,0 +1,44 @@
+"""
+Memory taken by a list of a million evaluated numbers: boxed as they were (a
+`Float` with a `__dict__` per value), boxed in the `__slots__` boxes that are
+left, and as they are evaluated now (plain floats).
+Run it directly: `python tests/values_memory_bench.py [count]`.
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import context as ctxs
+import tokenizer as tok
+import sem_lang_types as types
+
+class DictFloat:
+    """ How every number used to be evaluated. """
+    def __init__(self, name=None, binding=None):
+        self.name = name
+        self.binding = float(binding)
+
+def measure(make, count):
+    tracemalloc.start()
+    values = [make(i) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(values) == count
+    return size
+
+def main(count=10 ** 6):
+    ctx = ctxs.BaseContext(tok.evaluate_tree, tok.parse_type, dict())
+    results = [
+        ("boxed, with __dict__ (before)", lambda i: DictFloat(binding=i)),
+        ("boxed, with __slots__", lambda i: types.Float(binding=i)),
+        ("unboxed (evaluated now)", lambda i: ctx.literal(str(i))),
+    ]
+    print("{} values".format(count))
+    for name, make in results:
+        size = measure(make, count)
+        print("{:32} {:8.1f} MB {:6.1f} bytes/value".format(name, size / (1 << 20), size / count))
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -1,30 +1,187 @@
 """
 Basic lexer and parser for the sematics-lang
 """
+import codecs
+import re
 
+from syntax_tree import Atom, Form, Const, Var, CheckedForm
+from sem_lang_types import Tail
+
+# the tokens from the readme plus string literals, which may have spaces
+# (an open string matches too so it can be held back until it is closed).
+TOKEN_RE = re.compile(r'[()?:]|"[^"]*"?|[^\s()?:"]+')
+DELIMS = frozenset('()?:')
+CHUNK_SIZE = 1 << 16
+
+def is_complete(token, text):
+    """
+    Whether the last token matched in the text cannot go on into
+    the text after it.
+    """
+    if token[0] == '"':
+        return len(token) > 1 and token[-1] == '"'
+    return token in DELIMS or text[-1].isspace()
+
+def read_chunks(source, chunk_size=CHUNK_SIZE):
+    """
+    Gets the strs making up the source, which may be a str, a file
+    object (or an mmap -- anything with `read`) or any iterator over
+    strs. Bytes are decoded as utf-8.
+
+    Yields:
+      strs
+    """
+    if isinstance(source, str):
+        yield source
+        return
+    if hasattr(source, 'read'):
+        chunks = iter(lambda: source.read(chunk_size), source.read(0))
+    else:
+        chunks = iter(source)
+    decoder = None
+    for chunk in chunks:
+        if not isinstance(chunk, str):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        yield decoder.decode(b'', final=True)
+
+def scan(source):
+    """
+    Tokenizes the source (see `read_chunks`) a chunk at a time, keeping
+    track of where each token starts. String literals ("...") are single
+    tokens and may have spaces.
+
+    Raises:
+      ValueError = for a string literal that isn't closed.
+    Yields:
+      token, offset = the token and the offset in characters of its start.
+    """
+    pending = ''
+    base = 0
+    for chunk in read_chunks(source):
+        text = pending + chunk if pending else chunk
+        if not text:
+            continue
+        matches = [(m.group(), base + m.start()) for m in TOKEN_RE.finditer(text)]
+        base += len(text)
+        pending = ''
+        if matches and not is_complete(matches[-1][0], text):
+            pending, start = matches.pop()
+            base = start
+        yield from matches
+    if pending:
+        if pending[0] == '"':
+            raise ValueError("Unterminated string starting at {}".format(base))
+        yield pending, base
+
+def split_code(text):
+    """
+    Tokenizes text that has no string literals in it.
+    """
+    return text.replace('(', ' ( ').replace(')', ' ) ').replace('?', ' ? ').replace(':', ' : ').split()
+
+# `tokenize` splits on spaces for speed, while `scan` matches tokens to know
+# their offsets: they must give the same tokens for every source and every way
+# of chunking it (and `test_tokenizers_agree` compares them on random ones)
 def tokenize(char_iter):
     """
-    Given an input stream (any iterator over strs),
+    Given an input stream (any iterator over strs, a str, or a file),
     tokenizes the input as per the tokens in the readme.
+    String literals ("...") are single tokens and may have spaces.
+    See `scan` for the tokens with their offsets.
 
+    Raises:
+      ValueError = for a string literal that isn't closed.
     Yields:
       tokens
     """
-    def is_delim(char):
-        return char.isspace() or char in ['(', ')', '?', ':']
-
-    acc = ''
-    for char in char_iter:
-        if is_delim(char):
-            if acc != '':
-                yield acc
-            acc = ''
-            if not char.isspace():
-                yield char
-        else:
-            acc += char
-    if acc != '':
-        yield acc
+    pending = ''
+    for chunk in read_chunks(char_iter):
+        text = pending + chunk if pending else chunk
+        pending = ''
+        # odd parts are the insides of string literals
+        parts = text.split('"')
+        ends_in_code = len(parts) % 2 == 1
+        if not ends_in_code:
+            pending = '"' + parts.pop()
+        last = len(parts) - 1
+        for i, part in enumerate(parts):
+            if i % 2:
+                yield '"' + part + '"'
+                continue
+            tokens = split_code(part)
+            if i == last and ends_in_code and tokens and not is_complete(tokens[-1], part):
+                # might continue in the next chunk
+                pending = tokens.pop()
+            yield from tokens
+    if pending:
+        if pending[0] == '"':
+            raise ValueError("Unterminated string {}".format(pending))
+        yield pending
+
+# a unit of the top level: a delimiter, a string or an atom (after any spaces)
+UNIT_RE = re.compile(r'\s*(?:([()?:])|"[^"]*"?|[^\s()?:"]+)')
+# what matters within a form: parens and strings (that may have parens)
+NESTING_RE = re.compile(r'[()]|"[^"]*"?')
+SPACE_RE = re.compile(r'\s*')
+
+def skip_unit(text, pos):
+    """
+    Gets the end of the unit at pos (skipping spaces before it): a whole form
+    for an open paren. None if there is nothing but spaces left.
+    """
+    m = UNIT_RE.match(text, pos)
+    if m is None:
+        return None
+    if m.group(1) != '(':
+        return m.end()
+    depth = 0
+    for inner in NESTING_RE.finditer(text, m.end() - 1):
+        if inner.group() == '(':
+            depth += 1
+        elif inner.group() == ')':
+            depth -= 1
+            if depth == 0:
+                return inner.end()
+    # unbalanced: left to the parser to complain about
+    return len(text)
+
+def next_form(text, pos=0):
+    """
+    Finds the top-level expression after pos (with the annotation after it) by
+    balancing parens, without tokenizing what is in the forms.
+
+    Returns:
+      (start, end) offsets of the expression, None if there is none.
+    """
+    start = SPACE_RE.match(text, pos).end()
+    end = skip_unit(text, start)
+    if end is None:
+        return None
+    after = UNIT_RE.match(text, end)
+    if after is not None and after.group(1) == '?':
+        # ? semantics : type
+        end = after.end()
+        for _ in range(3):
+            end = skip_unit(text, end) or len(text)
+    return start, end
+
+def split_forms(text):
+    """
+    Splits the text into its top-level expressions (see `next_form`).
+
+    Returns:
+      list of (start, end) offsets of the expressions.
+    """
+    spans = []
+    span = next_form(text)
+    while span is not None:
+        spans.append(span)
+        span = next_form(text, span[1])
+    return spans
 
 def parse_type(tokens, context, index):
     """ return semantics, types, index """
@@ -44,49 +201,212 @@ def parse_type(tokens, context, index):
         index += 5
         args = []
         while index < len(tokens) and tokens[index] != ')':
-            sem, typ, index = parse_type(tokens, context, index)
-            args.append((sem, typ))
+            _, typ, index = parse_type(tokens, context, index)
+            args.append(typ)
         if index >= len(tokens) or tokens[index] != ')':
             raise ValueError("Expected )")
         return semantics, context.get_type(semantics, base_type, *args), index + 1
     else:
-        return semantics, context.get_type(semantics, tokens[index + 3], []), index + 4
+        return semantics, context.get_type(semantics, tokens[index + 3]), index + 4
 
-def evaluate(tokens, context, index = 0):
+def parse(tokens, context, index=0):
     """
-    Evaluate the *list* of tokens in the context,
-    starting at index provided.
+    Parse the expression starting at the index into a syntax tree.
+    The type annotations are resolved through the context as they're
+    met, so the tree need not be re-read to evaluate it.
 
     Args:
       tokens = a list of strings that are the tokens of the program.
-      context = an AbstractContext that understands the types and symbols in the program.
+      context = an AbstractContext that understands the types in the program.
       index (default 0) = the index in the list to parse at.
-    Raises: (Note that the context may raise exceptions too)
-      ValueError = parsing issues with the token list or a type error.
+    Raises:
+      ValueError = parsing issues with the token list.
     Returns:
-      The evaluation of the code.
+      node, index = the syntax tree and the index after it.
     """
     if index >= len(tokens):
         raise ValueError("Expected tokens")
     t = tokens[index]
     if t == '(':
-        calling, index = evaluate(tokens, context, index + 1)
-        if context.is_special_form(calling):
-            return context.eval(tokens, index + 1, calling)
-        else:
-            args = []
-            while tokens[index] != ')' and index < len(tokens):
-                arg, index = evaluate(tokens, context, index)
-                args.append(arg)
-            if tokens[index] != ')':
-                raise ValueError("Expected tokens")
-            evaled = context.call(calling, *args)
+        index += 1
+        children = []
+        while index < len(tokens) and tokens[index] != ')':
+            child, index = parse(tokens, context, index)
+            children.append(child)
+        if index >= len(tokens):
+            raise ValueError("Expected )")
+        index += 1
+    elif t in [')', '?', ':']:
+        raise ValueError("Unexpected {}".format(t))
     else:
-        evaled = context.literal(t)
-    if index + 1 < len(tokens) and tokens[index + 1] == '?':
-        semantics, typ, index = parse_type(tokens, context, index + 1)
-        if not context.validate_type(evaled, semantics, typ):
+        index += 1
+    annotation = None
+    if index < len(tokens) and tokens[index] == '?':
+        semantics, typ, index = parse_type(tokens, context, index)
+        annotation = (semantics, typ)
+    if t == '(':
+        return Form(children, annotation), index
+    return Atom(t, annotation), index
+
+def parse_program(tokens, context):
+    """
+    Parse every top-level expression in the list of tokens.
+
+    Returns:
+      tuple of the syntax trees, in order.
+    """
+    nodes = []
+    index = 0
+    while index < len(tokens):
+        node, index = parse(tokens, context, index)
+        nodes.append(node)
+    return tuple(nodes)
+
+def add_check(checks, check):
+    """
+    Adds a check (an annotation or a return type) to be made on the value of
+    a tail, unless it's pending already (after the last form waiting on a
+    value, in `evaluate_stack`'s stack): then checking once will do and tail
+    recursion needn't pile up checks, even when annotations and return types
+    alternate.
+    """
+    if check is None:
+        return
+    for pending in reversed(checks):
+        if type(pending) is list:
+            break
+        if pending == check:
+            return
+    checks.append(check)
+
+def run_check(context, check, value):
+    if isinstance(check, tuple):
+        if not context.validate_type(value, *check):
             raise ValueError("type error in the code")
-        return evaled, index
-    else:
-        return evaled, index + 1
+    elif not check.validate(value):
+        raise ValueError("Type error in the return: {} is not a {}".format(value, check))
+
+def evaluate_tree(node, context):
+    """
+    Evaluate the syntax tree (see `parse`), or one resolved by the
+    context (see `AbstractContext.resolve`), in the context.
+
+    A `Tail` from a call or special form is evaluated in place (rather
+    than by recursing) so that tail calls take constant stack.
+
+    Raises: (Note that the context may raise exceptions too)
+      ValueError = a type error.
+    Returns:
+      The evaluation of the code.
+    """
+    checker = context
+    checks = []
+    while True:
+        if isinstance(node, Form):
+            calling = evaluate_tree(node.head, context)
+            if context.is_special_form(calling):
+                evaled = context.eval(node, calling)
+            else:
+                args = [evaluate_tree(arg, context) for arg in node.args]
+                if type(node) is CheckedForm:
+                    evaled = context.call_checked(calling, *args)
+                else:
+                    evaled = context.call(calling, *args)
+            if isinstance(evaled, Tail):
+                add_check(checks, node.annotation)
+                add_check(checks, evaled.check)
+                node, context = evaled.node, evaled.context
+                continue
+        elif isinstance(node, Var):
+            evaled = context.lookup(node.depth, node.slot)
+        elif isinstance(node, Const):
+            evaled = node.value
+        else:
+            evaled = context.literal(node.token)
+        if node.annotation is not None:
+            run_check(context, node.annotation, evaled)
+        for check in reversed(checks):
+            run_check(checker, check, evaled)
+        return evaled
+
+def evaluate_stack(node, context):
+    """
+    Evaluate the syntax tree like `evaluate_tree` but keeping the forms being
+    evaluated on a stack of its own rather than on python's, so that how deep
+    the recursion of the program goes is only limited by memory. (Special forms
+    evaluating sub-expressions, like the condition of an `if!`, still recurse.)
+
+    Raises: (Note that the context may raise exceptions too)
+      ValueError = a type error.
+    Returns:
+      The evaluation of the code.
+    """
+    checker = context
+    # each entry is either a check or [form, context, evaluated children]
+    stack = []
+    while True:
+        if isinstance(node, Form):
+            if not node.children:
+                raise ValueError("Empty form cannot be evaluated")
+            stack.append([node, context, []])
+            node = node.children[0]
+            continue
+        if isinstance(node, Var):
+            value = context.lookup(node.depth, node.slot)
+        elif isinstance(node, Const):
+            value = node.value
+        else:
+            value = context.literal(node.token)
+        if node.annotation is not None:
+            run_check(context, node.annotation, value)
+        # give the value to the forms waiting on it until one needs more evaluated
+        while True:
+            if not stack:
+                return value
+            top = stack[-1]
+            if type(top) is not list:
+                stack.pop()
+                run_check(checker, top, value)
+                continue
+            form, form_context, values = top
+            values.append(value)
+            if len(values) == 1 and form_context.is_special_form(value):
+                stack.pop()
+                value = form_context.eval(form, value)
+            elif len(values) < len(form.children):
+                node, context = form.children[len(values)], form_context
+                break
+            else:
+                stack.pop()
+                if type(form) is CheckedForm:
+                    value = form_context.call_checked(values[0], *values[1:])
+                else:
+                    value = form_context.call(values[0], *values[1:])
+            if isinstance(value, Tail):
+                add_check(stack, form.annotation)
+                add_check(stack, value.check)
+                node, context = value.node, value.context
+                break
+            if form.annotation is not None:
+                run_check(form_context, form.annotation, value)
+
+def evaluate(tokens, context, index = 0):
+    """
+    Evaluate the *list* of tokens in the context,
+    starting at index provided.
+
+    This parses the expression on every call, so code that is run
+    repeatedly should be parsed once (see `parse`) and handed to
+    `evaluate_tree` instead.
+
+    Args:
+      tokens = a list of strings that are the tokens of the program.
+      context = an AbstractContext that understands the types and symbols in the program.
+      index (default 0) = the index in the list to parse at.
+    Raises: (Note that the context may raise exceptions too)
+      ValueError = parsing issues with the token list or a type error.
+    Returns:
+      The evaluation of the code and the index after it.
+    """
+    node, index = parse(tokens, context, index)
+    return evaluate_tree(node, context), index